@@ -0,0 +1,271 @@
+import os
+import sys
+from datetime import datetime
+from functools import lru_cache
+import numpy as np
+
+from incident_store import IncidentStore
+
+# Same tolerance as dedupe_index.CLOCK_SKEW: a CHP time later than the record
+# stamp by more than this happened the day before
+CLOCK_SKEW = np.timedelta64(10, "m")
+WINDOWS = {"1h": 1, "24h": 24, "7d": 24 * 7}
+PERCENTILES = (50, 90, 99)
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+@lru_cache(maxsize=4096)
+def minutes_of_day(time_str):
+    """
+    Minutes after midnight of a CHP 'Time' such as "5:59 PM", or -1.
+    """
+    try:
+        parsed = datetime.strptime(time_str, "%I:%M %p")
+    except (TypeError, ValueError):
+        return -1
+    return parsed.hour * 60 + parsed.minute
+
+class Codes:
+    """
+    Interns strings as small integers so breakdowns are np.bincount calls.
+    """
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def code(self, value):
+        value = value or "Unknown"
+        if value not in self.index:
+            self.index[value] = len(self.values)
+            self.values.append(value)
+        return self.index[value]
+
+class IncidentAnalytics:
+    """
+    Running aggregates of an IncidentStore, refreshed from the bytes
+    appended since the last refresh.
+
+    A refresh only touches the new records: their times are merged into a
+    sorted array with searchsorted, and the heatmap and the type and
+    location counts are bumped with np.add.at. Percentiles need the whole
+    history, so they are computed on demand and cached until it changes.
+
+    Each incident's time is the CHP 'Time' on the date it was recorded
+    (the day before if that would be in the future), or the 'Recorded'
+    stamp itself without a usable 'Time'. Records from before stamping
+    have no time and only count towards totals and breakdowns.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.generation = None
+        self.offset = 0
+        self._reset()
+
+    def _reset(self):
+        self.types = Codes()
+        self.locations = Codes()
+        self.total = 0
+        self.heatmap_counts = np.zeros(7 * 24, dtype=np.int64)
+        self.type_counts = np.zeros(0, dtype=np.int64)
+        self.location_counts = np.zeros(0, dtype=np.int64)
+        # Sorted incident times in a buffer that grows by doubling
+        self.time_buffer = np.empty(1024, dtype="datetime64[m]")
+        self.timed = 0
+        self.cached_percentiles = None
+        self.offset = 0
+
+    @property
+    def sorted_times(self):
+        return self.time_buffer[:self.timed]
+
+    def refresh(self):
+        """
+        Reads new incidents from the store. Returns True if anything changed.
+        """
+        if self.generation != self.store.generation:
+            self._reset()
+            self.generation = self.store.generation
+            changed = True
+        else:
+            changed = False
+        if self.store.log_size == self.offset:
+            return changed
+        records, self.offset = self.store.read_from(self.offset)
+        self.extend(records)
+        return True
+
+    def extend(self, records):
+        if not records:
+            return
+        recorded = []
+        minutes = []
+        types = []
+        locations = []
+        for record in records:
+            recorded.append(record.get("Recorded") or "NaT")
+            minutes.append(minutes_of_day(record.get("Time")))
+            types.append(self.types.code(record.get("Type")))
+            locations.append(self.locations.code(record.get("Location")))
+        self.total += len(records)
+        self.type_counts = count_codes(self.type_counts, types, len(self.types.values))
+        self.location_counts = count_codes(self.location_counts, locations, len(self.locations.values))
+
+        times = incident_times(np.array(recorded, dtype="datetime64[m]"), np.array(minutes, dtype=np.int64))
+        times = np.sort(times[~np.isnat(times)])
+        if len(times):
+            self._merge(times)
+            np.add.at(self.heatmap_counts, heatmap_cells(times), 1)
+        self.cached_percentiles = None
+
+    def _merge(self, times):
+        count = self.timed + len(times)
+        if count > len(self.time_buffer):
+            buffer = np.empty(max(count, 2 * len(self.time_buffer)), dtype=self.time_buffer.dtype)
+            buffer[:self.timed] = self.sorted_times
+            self.time_buffer = buffer
+        # New incidents are among the latest, so only a short tail after the
+        # first insert position moves
+        positions = np.searchsorted(self.sorted_times, times, side="right")
+        first = positions[0]
+        tail = self.time_buffer[first:self.timed].copy()
+        self.time_buffer[first:count] = np.insert(tail, positions - first, times)
+        self.timed = count
+
+    # --- Metrics ---
+    def heatmap(self):
+        """
+        7 x 24 counts of incidents by weekday (Monday first) and hour.
+        """
+        return self.heatmap_counts.reshape(7, 24)
+
+    def rates(self, now):
+        """
+        Incidents and incidents per hour in the windows ending at now.
+        """
+        now = np.datetime64(now, "m")
+        end = np.searchsorted(self.sorted_times, now, side="right")
+        rates = {}
+        for name, hours in WINDOWS.items():
+            start = np.searchsorted(self.sorted_times, now - np.timedelta64(hours * 60, "m"), side="right")
+            count = int(end - start)
+            rates[name] = {"count": count, "per_hour": count / hours}
+        return rates
+
+    def breakdown(self, counts, interned, top=10):
+        counts = counts[:len(interned.values)]
+        order = np.arange(len(counts))
+        if len(counts) > top:
+            # Only the top entries need sorting
+            order = np.argpartition(counts, -top)[-top:]
+        order = order[np.argsort(counts[order])[::-1]]
+        return [(interned.values[index], int(counts[index])) for index in order if counts[index]]
+
+    def percentiles(self):
+        """
+        Percentiles of the minutes between consecutive incidents and of
+        the number of incidents per day. Cached until new incidents arrive.
+        """
+        if self.cached_percentiles is not None:
+            return self.cached_percentiles
+        if self.timed < 2:
+            self.cached_percentiles = {"gap_minutes": {}, "per_day": {}}
+            return self.cached_percentiles
+        gaps = np.diff(self.sorted_times).astype(np.int64)
+        days = self.sorted_times.astype("datetime64[D]").astype(np.int64)
+        per_day = np.bincount(days - days[0])
+        self.cached_percentiles = {
+            "gap_minutes": dict(zip(PERCENTILES, np.percentile(gaps, PERCENTILES).tolist())),
+            "per_day": dict(zip(PERCENTILES, np.percentile(per_day, PERCENTILES).tolist())),
+        }
+        return self.cached_percentiles
+
+    def metrics(self, now=None, with_percentiles=False):
+        """
+        Every metric at once, as plain Python values. Apart from the
+        percentiles, which need the whole history, this does not depend on
+        the number of incidents.
+        """
+        now = now or datetime.now()
+        heatmap = self.heatmap()
+        timed = self.timed
+        span_hours = 0.0
+        if timed > 1:
+            span_hours = float((self.sorted_times[-1] - self.sorted_times[0]).astype(np.int64)) / 60
+        by_hour = heatmap.sum(axis=0)
+        metrics = {
+            "total": self.total,
+            "last_incident": str(self.sorted_times[-1]) if timed else None,
+            "per_hour_average": timed / max(span_hours, 1.0) if timed else 0.0,
+            "busiest_hour": int(np.argmax(by_hour)) if timed else None,
+            "by_hour": by_hour.tolist(),
+            "heatmap": heatmap.tolist(),
+            "rates": self.rates(now),
+            "types": self.breakdown(self.type_counts, self.types),
+            "locations": self.breakdown(self.location_counts, self.locations),
+        }
+        if with_percentiles:
+            metrics["percentiles"] = self.percentiles()
+        return metrics
+
+def incident_times(recorded, minutes):
+    """
+    Incident times from 'Recorded' stamps and CHP minutes of the day (-1
+    when unknown).
+    """
+    times = recorded.astype("datetime64[D]").astype("datetime64[m]") + minutes.astype("timedelta64[m]")
+    times[times - recorded > CLOCK_SKEW] -= np.timedelta64(1, "D")
+    return np.where(minutes < 0, recorded, times)
+
+def heatmap_cells(times):
+    """
+    Flat weekday * 24 + hour cell of each time.
+    """
+    minutes = times.astype(np.int64)
+    hours = (minutes // 60) % 24
+    # 1970-01-01 was a Thursday
+    weekdays = (minutes // (24 * 60) + 3) % 7
+    return weekdays * 24 + hours
+
+def count_codes(counts, codes, size):
+    """
+    Adds one to counts for each code, growing counts to hold size codes.
+    """
+    if size > len(counts):
+        counts = np.concatenate([counts, np.zeros(max(size, 2 * len(counts)) - len(counts), dtype=counts.dtype)])
+    np.add.at(counts, np.array(codes, dtype=np.intp), 1)
+    return counts
+
+def format_report(metrics):
+    lines = [
+        f"Incidents: {metrics['total']}",
+        f"Last incident: {metrics['last_incident'] or 'N/A'}",
+        f"Average per hour: {metrics['per_hour_average']:.2f}",
+        "Rates: " + ", ".join(
+            f"{name} {rate['count']} ({rate['per_hour']:.2f}/h)" for name, rate in metrics["rates"].items()
+        ),
+        "",
+        "Hour x weekday:",
+        "     " + "".join(f"{hour:>5}" for hour in range(24)),
+    ]
+    for name, row in zip(WEEKDAYS, metrics["heatmap"]):
+        lines.append(f"  {name} " + "".join(f"{count:>5}" for count in row))
+    lines.append("")
+    lines.append("Top types:")
+    lines.extend(f"  {count:>6}  {name}" for name, count in metrics["types"])
+    lines.append("Top locations:")
+    lines.extend(f"  {count:>6}  {name}" for name, count in metrics["locations"])
+    for name, values in metrics.get("percentiles", {}).items():
+        if values:
+            lines.append(f"{name} percentiles: " + ", ".join(f"p{p} {value:.1f}" for p, value in values.items()))
+    return "\n".join(lines)
+
+# CLI report: python analytics.py [incidents.jsonl]
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        if not os.path.isfile(sys.argv[1]):
+            sys.exit(f"No incident log at {sys.argv[1]}")
+        store = IncidentStore(log_path=sys.argv[1], index_path=f"{sys.argv[1]}.idx.json", legacy_path=None)
+    else:
+        store = IncidentStore()
+    analytics = IncidentAnalytics(store)
+    analytics.refresh()
+    print(format_report(analytics.metrics(with_percentiles=True)))
@@ -0,0 +1,59 @@
+"""
+Times IncidentAnalytics on a synthetic history.
+
+Usage: python benchmarks/bench_analytics.py [incident_count]
+
+Incidents are spread over a year with a daily rush-hour profile, 40 types
+and 2000 locations. Loading is measured once. An update is what the GUI
+pays per new incident, extend() with one record and metrics(), and should
+not grow with the history. Percentiles are only computed for the CLI report.
+"""
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analytics import IncidentAnalytics, format_report  # noqa: E402
+
+HOUR_WEIGHTS = [1, 1, 1, 1, 2, 4, 7, 9, 8, 5, 4, 4, 5, 5, 6, 8, 10, 9, 6, 4, 3, 2, 2, 1]
+
+def synthetic_records(count, seed=1, start=datetime(2024, 1, 1), days=365):
+    rng = random.Random(seed)
+    records = []
+    for number in range(count):
+        moment = start + timedelta(days=rng.randrange(days), hours=rng.choices(range(24), HOUR_WEIGHTS)[0],
+                                   minutes=rng.randrange(60))
+        recorded = moment + timedelta(minutes=rng.randrange(5))
+        records.append({
+            "No.": f"{number % 2000:04d}",
+            "Time": moment.strftime("%I:%M %p").lstrip("0"),
+            "Type": f"Type {int(rng.paretovariate(1.2)) % 40}",
+            "Location": f"Location {int(rng.paretovariate(1.1)) % 2000}",
+            "Recorded": recorded.isoformat(timespec="seconds"),
+        })
+    return records
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    records = synthetic_records(count)
+    analytics = IncidentAnalytics(store=None)
+
+    load_time = timeit.timeit(lambda: analytics.extend(records), number=1)
+    now = datetime(2024, 12, 31, 18, 0)
+    metrics_time = min(timeit.repeat(lambda: analytics.metrics(now), number=10, repeat=5)) / 10
+    # New incidents arrive after the history, in order
+    new_incidents = iter(sorted(synthetic_records(1000, seed=2, start=datetime(2025, 1, 1), days=1),
+                                key=lambda record: record["Recorded"]))
+    update_time = min(timeit.repeat(
+        lambda: (analytics.extend([next(new_incidents)]), analytics.metrics(now)), number=100, repeat=5,
+    )) / 100
+    percentiles_time = timeit.timeit(analytics.percentiles, number=1)
+    print(f"{count} incidents")
+    print(f"  load        : {load_time * 1000:8.1f} ms (once; later refreshes only read new records)")
+    print(f"  metrics     : {metrics_time * 1000:8.3f} ms")
+    print(f"  update      : {update_time * 1000:8.3f} ms per new incident")
+    print(f"  percentiles : {percentiles_time * 1000:8.1f} ms (on demand)")
+    print()
+    print(format_report(analytics.metrics(now, with_percentiles=True)))
@@ -0,0 +1,97 @@
+"""
+Compares the targeted chp_parser extractor with the previous BeautifulSoup
+and whole-page regex path on saved CHP pages.
+
+Usage: python benchmarks/bench_parser.py [traffic_page.html detail_page.html]
+
+The bundled fixtures reproduce the layout of cad.chp.ca.gov (large
+__VIEWSTATE, center drop-down, 32-row gvIncidents table, detail log). Pass
+pages saved from the live site to benchmark against real responses.
+"""
+import os
+import re
+import sys
+import timeit
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chp_parser import parse_detail_page, parse_incident_table  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+LAT_LON_PATTERN = re.compile(r"(\d+\.\d+ -\d+\.\d+)")
+BRACKETS_PATTERN = re.compile(r'\[.*?\]')
+EXCLUDED_DETAILS = {'Unit At Scene', 'Unit Enroute', 'Unit Assigned'}
+
+# --- Previous implementation, kept here as the baseline ---
+def soup_incident_rows(response_text):
+    soup = BeautifulSoup(response_text, 'html.parser')
+    table = soup.find('table', id='gvIncidents')
+    if table is None:
+        return []
+    headers = [th.text.strip() for th in table.find_all('th')]
+    rows = []
+    for row_index, row in enumerate(table.find_all('tr')[1:]):
+        cells = row.find_all('td')
+        if not cells:
+            continue
+        row_data = [cell.text.strip() for cell in cells]
+        rows.append((row_index, dict(zip(headers, row_data))))
+    return rows
+
+def regex_traffic_info(response_text):
+    matches = LAT_LON_PATTERN.findall(response_text)
+    pattern = re.compile(r'<td[^>]*colspan="6"[^>]*>(.*?)</td>', re.DOTALL)
+    matches_two = pattern.findall(response_text)
+    details = []
+    for match in matches_two:
+        clean_detail = BRACKETS_PATTERN.sub('', match).strip()
+        if not any(excluded_detail in clean_detail for excluded_detail in EXCLUDED_DETAILS):
+            details.append(clean_detail)
+    if matches:
+        for match in matches:
+            lat_str, lon_str = match.split()
+            if len(lat_str.split('.')[-1]) == 6 and len(lon_str.split('.')[-1]) == 6:
+                return {
+                    "Latitude": float(lat_str),
+                    "Longitude": float(lon_str),
+                    "Details": details
+                }
+    return None
+
+# --- Measurements ---
+def time_per_call(func, html, number):
+    return min(timeit.repeat(lambda: func(html), number=number, repeat=5)) / number
+
+def peak_allocation(func, html):
+    tracemalloc.start()
+    func(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def compare(name, baseline, candidate, html, number):
+    if baseline(html) != candidate(html):
+        raise SystemExit(f"{name}: outputs differ between the two parsers")
+    old_time = time_per_call(baseline, html, number)
+    new_time = time_per_call(candidate, html, number)
+    old_peak = peak_allocation(baseline, html)
+    new_peak = peak_allocation(candidate, html)
+    print(f"{name} ({len(html) / 1024:.0f} KiB)")
+    print(f"  parse time : {old_time * 1000:8.3f} ms -> {new_time * 1000:8.3f} ms  ({old_time / new_time:.0f}x faster)")
+    print(f"  peak alloc : {old_peak / 1024:8.0f} KiB -> {new_peak / 1024:8.0f} KiB  ({old_peak / max(new_peak, 1):.0f}x less)")
+
+def read(path):
+    with open(path, encoding="utf-8") as file:
+        return file.read()
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        table_path, detail_path = sys.argv[1:]
+    else:
+        table_path = os.path.join(FIXTURES, "traffic_page.html")
+        detail_path = os.path.join(FIXTURES, "detail_page.html")
+    compare("incident table", soup_incident_rows, parse_incident_table, read(table_path), 20)
+    compare("detail page", regex_traffic_info, parse_detail_page, read(detail_path), 200)
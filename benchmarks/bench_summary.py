@@ -0,0 +1,80 @@
+"""
+Compares the local table-driven summary with the LLM summary path on the
+incidents of the saved CHP pages.
+
+Usage: python benchmarks/bench_summary.py [traffic_page.html detail_page.html]
+
+The LLM path is only measured when GPT_KEY is set. OPENAI_BASE_URL and
+SUMMARY_MODEL point it at another OpenAI-compatible server or model. Its
+cache is disabled so every incident is a real request.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import local_summary  # noqa: E402
+from chp_parser import parse_detail_page, parse_incident_table  # noqa: E402
+from summarizer import Summarizer  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def load_incidents(table_path, detail_path):
+    with open(table_path, encoding="utf-8") as file:
+        rows = [row for _, row in parse_incident_table(file.read())]
+    with open(detail_path, encoding="utf-8") as file:
+        details = parse_detail_page(file.read())["Details"]
+    # Published incidents have no 'Area' but a geocoded 'City', which the
+    # table's Area stands in for here
+    return [dict(row, Details=details, City=row.pop("Area", None)) for row in rows]
+
+def bench_local(incidents):
+    local_summary.decode_type.cache_clear()
+    local_summary.decode_detail.cache_clear()
+    start = time.perf_counter()
+    for incident in incidents:
+        local_summary.summarize(incident)
+    cold = (time.perf_counter() - start) / len(incidents)
+    warm = min(timeit.repeat(lambda: [local_summary.summarize(incident) for incident in incidents],
+                             number=100, repeat=5)) / (100 * len(incidents))
+    print(f"local summary ({len(incidents)} incidents)")
+    print(f"  first call : {cold * 1e6:8.1f} us per incident")
+    print(f"  warm       : {warm * 1e6:8.1f} us per incident")
+    print(f"  example    : {local_summary.summarize(incidents[0])}")
+    return warm
+
+async def bench_llm(incidents):
+    summarizer = Summarizer(
+        api_key=os.getenv("GPT_KEY"),
+        base_url=os.getenv("OPENAI_BASE_URL"),
+        model=os.getenv("SUMMARY_MODEL", "gpt-4o-mini"),
+        deadline=30.0,
+        cache_size=0,
+    )
+    latencies = []
+    for incident in incidents:
+        start = time.perf_counter()
+        summary = await summarizer.summarize(incident)
+        latencies.append(time.perf_counter() - start)
+    print(f"llm summary ({len(incidents)} incidents)")
+    print(f"  median     : {statistics.median(latencies) * 1000:8.1f} ms per incident")
+    print(f"  slowest    : {max(latencies) * 1000:8.1f} ms")
+    print(f"  example    : {summary}")
+    return statistics.median(latencies)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        table_path, detail_path = sys.argv[1:]
+    else:
+        table_path = os.path.join(FIXTURES, "traffic_page.html")
+        detail_path = os.path.join(FIXTURES, "detail_page.html")
+    incidents = load_incidents(table_path, detail_path)
+    local_time = bench_local(incidents)
+    if not os.getenv("GPT_KEY"):
+        print("GPT_KEY is not set, skipping the LLM path.")
+    else:
+        llm_time = asyncio.run(bench_llm(incidents[:5]))
+        print(f"local summary is {llm_time / local_time:,.0f}x faster than the median LLM call")
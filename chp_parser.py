@@ -0,0 +1,155 @@
+import hashlib
+import re
+from html import unescape
+
+# Targeted extractor for the CHP traffic page. Instead of building a full
+# BeautifulSoup tree it scans the raw response with str.find, skips the large
+# __VIEWSTATE blob and only tokenizes the gvIncidents table and the detail rows.
+
+VIEWSTATE_MARKER = 'id="__VIEWSTATE"'
+TABLE_MARKER = 'id="gvIncidents"'
+DETAIL_MARKER = 'colspan="6"'
+TAG_PATTERN = re.compile(r'<[^>]*>')
+LAT_LON_PATTERN = re.compile(r"(\d+\.\d+ -\d+\.\d+)")
+BRACKETS_PATTERN = re.compile(r'\[.*?\]')
+
+EXCLUDED_DETAILS = {'Unit At Scene', 'Unit Enroute', 'Unit Assigned'}
+
+def _viewstate_span(html):
+    """
+    Returns the (start, end) offsets of the __VIEWSTATE value, or None.
+    """
+    marker = html.find(VIEWSTATE_MARKER)
+    if marker == -1:
+        return None
+    tag_start = html.rfind('<', 0, marker)
+    tag_end = html.find('>', marker)
+    value = html.find('value="', tag_start, tag_end)
+    if value == -1:
+        return None
+    start = value + len('value="')
+    end = html.find('"', start)
+    return start, end
+
+def extract_viewstate(html):
+    span = _viewstate_span(html)
+    if span is None:
+        return None
+    start, end = span
+    return html[start:end] or None
+
+def _content_offset(html):
+    """
+    Offset after the viewstate blob, where the incident markup begins.
+    """
+    span = _viewstate_span(html)
+    return span[1] if span else 0
+
+def _cell_text(fragment):
+    return unescape(TAG_PATTERN.sub('', fragment)).strip()
+
+def _cells(row, tag):
+    """
+    Yields the inner markup of every <td>/<th> cell of a row fragment.
+    """
+    open_tag = f'<{tag}'
+    close_tag = f'</{tag}>'
+    position = row.find(open_tag)
+    while position != -1:
+        content_start = row.find('>', position) + 1
+        content_end = row.find(close_tag, content_start)
+        if content_end == -1:
+            content_end = len(row)
+        yield row[content_start:content_end]
+        position = row.find(open_tag, content_end)
+
+def incident_table_fragment(html):
+    """
+    Returns the raw markup of the gvIncidents table, or None.
+    """
+    marker = html.find(TABLE_MARKER, _content_offset(html))
+    if marker == -1:
+        return None
+    table_start = html.rfind('<table', 0, marker)
+    table_end = html.find('</table>', marker)
+    if table_end == -1:
+        table_end = len(html)
+    return html[table_start:table_end]
+
+def table_fingerprint(html):
+    """
+    Cheap content hash of the incident table. The viewstate and the rest of
+    the page change on every request, so only the table fragment is hashed.
+    """
+    table = incident_table_fragment(html) or ''
+    return hashlib.blake2b(table.encode(), digest_size=16).hexdigest()
+
+def parse_incident_table(html):
+    """
+    Returns [(row_index, row_dict), ...] for the gvIncidents table, in the same
+    shape as traffic_scraper.parse_incident_rows. Scanning stops at the end of
+    the table.
+    """
+    table = incident_table_fragment(html)
+    if table is None:
+        return []
+
+    headers = [_cell_text(cell) for cell in _cells(table, 'th')]
+    rows = []
+    row_index = 0
+    for row in table.split('<tr')[1:]:
+        if '<td' not in row:
+            continue
+        row_data = [_cell_text(cell) for cell in _cells(row, 'td')]
+        rows.append((row_index, dict(zip(headers, row_data))))
+        row_index += 1
+    return rows
+
+def parse_detail_page(html):
+    """
+    Extracts the coordinates and detail log of the selected incident in the
+    same shape as traffic_scraper.extract_traffic_info.
+    """
+    offset = _content_offset(html)
+    details = []
+    position = html.find(DETAIL_MARKER, offset)
+    while position != -1:
+        tag_start = html.rfind('<', 0, position)
+        content_start = html.find('>', position) + 1
+        if html.startswith('<td', tag_start) and content_start:
+            content_end = html.find('</td>', content_start)
+            if content_end == -1:
+                break
+            clean_detail = BRACKETS_PATTERN.sub('', html[content_start:content_end]).strip()
+            if not any(excluded_detail in clean_detail for excluded_detail in EXCLUDED_DETAILS):
+                details.append(clean_detail)
+            position = content_end
+        position = html.find(DETAIL_MARKER, position + 1)
+
+    coordinates = _find_lat_lon(html, offset)
+    if coordinates:
+        lat_str, lon_str = coordinates
+        return {
+            "Latitude": float(lat_str),
+            "Longitude": float(lon_str),
+            "Details": details
+        }
+    return None
+
+def _find_lat_lon(html, offset):
+    """
+    Finds the first "dd.dddddd -ddd.dddddd" pair after offset. Every pair
+    contains " -", so only those positions are matched against the pattern.
+    """
+    position = html.find(' -', offset)
+    while position != -1:
+        start = position
+        while start > offset and (html[start - 1].isdigit() or html[start - 1] == '.'):
+            start -= 1
+        match = LAT_LON_PATTERN.match(html, start)
+        if match:
+            lat_str, lon_str = match.group(1).split()
+            if len(lat_str.split('.')[-1]) == 6 and len(lon_str.split('.')[-1]) == 6:
+                return lat_str, lon_str
+        position = html.find(' -', position + 2)
+    return None
@@ -0,0 +1,92 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from scheduler import LOCAL_TIMEZONE
+
+# Rows whose time is at most this far in the future are clock skew, not yesterday
+CLOCK_SKEW = timedelta(minutes=10)
+
+def incident_date(time_str, now=None):
+    """
+    Date of a CHP row from its 'Time' ("11:58 PM"). CHP numbers restart every
+    day and rows stay listed past midnight, so a time later than now belongs
+    to yesterday.
+    """
+    now = now or datetime.now(LOCAL_TIMEZONE).replace(tzinfo=None)
+    try:
+        parsed = datetime.strptime(time_str or "", "%I:%M %p")
+    except ValueError:
+        return now.date()
+    moment = datetime.combine(now.date(), parsed.time())
+    if moment - now > CLOCK_SKEW:
+        moment -= timedelta(days=1)
+    return moment.date()
+
+class DedupeIndex:
+    """
+    Persistent set of posted incidents keyed on (center, date, number).
+
+    Keys are appended to a small log file, so adding one is O(1) and a
+    restart only reads the keys of the last window_days days. Older keys
+    expire. The log is rewritten with only the live keys once it holds
+    more than twice as many lines. With path=None the index is in-memory
+    only.
+    """
+    def __init__(self, path="dedupe_index.log", window_days=3):
+        self.path = path
+        self.window_days = window_days
+        self.lock = threading.Lock()
+        self.keys = set()
+        self.log_lines = 0
+        self.is_new = not (path and os.path.exists(path))
+        self._load()
+
+    def _load(self):
+        if self.is_new:
+            return
+        cutoff = self._cutoff()
+        with open(self.path, "r") as file:
+            for line in file:
+                self.log_lines += 1
+                parts = line.rstrip("\n").split(",", 2)
+                if len(parts) == 3 and parts[1] >= cutoff:
+                    self.keys.add(tuple(parts))
+        self._compact_if_needed()
+
+    def _cutoff(self):
+        today = datetime.now(LOCAL_TIMEZONE).date()
+        return (today - timedelta(days=self.window_days)).isoformat()
+
+    def contains(self, center, number, day):
+        return (center, day.isoformat(), number) in self.keys
+
+    def add(self, center, number, day):
+        key = (center, day.isoformat(), number)
+        with self.lock:
+            if key in self.keys:
+                return
+            self.keys.add(key)
+            if self.path:
+                with open(self.path, "a") as file:
+                    file.write(",".join(key) + "\n")
+                self.log_lines += 1
+                self._compact_if_needed()
+
+    def expire(self):
+        """
+        Drops keys older than the window and compacts the log if needed.
+        """
+        cutoff = self._cutoff()
+        with self.lock:
+            self.keys = {key for key in self.keys if key[1] >= cutoff}
+            self._compact_if_needed()
+
+    def _compact_if_needed(self):
+        if not self.path or self.log_lines <= 2 * max(len(self.keys), 64):
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as file:
+            for key in sorted(self.keys, key=lambda key: key[1]):
+                file.write(",".join(key) + "\n")
+        os.replace(temp_path, self.path)
+        self.log_lines = len(self.keys)
@@ -0,0 +1,97 @@
+import time
+from collections import Counter
+
+# Discord rejects message content longer than this
+MAX_MESSAGE_LENGTH = 2000
+
+def appended_lines(old_details, new_details):
+    """
+    Returns the lines of new_details that were not in old_details, in the
+    order CHP lists them. Repeated lines are counted, so a line that CHP logs
+    twice is reported the second time too.
+    """
+    remaining = Counter(old_details)
+    added = []
+    for line in new_details:
+        if remaining[line] > 0:
+            remaining[line] -= 1
+        else:
+            added.append(line)
+    return added
+
+class TrackedIncident:
+    def __init__(self, incident, message, summary):
+        self.center = incident.get("Center")
+        self.number = incident.get("No.")
+        self.message = message
+        self.summary = summary
+        self.details = list(incident.get("Details") or [])
+        self.updates = []
+        self.first_seen = time.monotonic()
+        self.last_refresh = self.first_seen
+
+class DetailTracker:
+    """
+    Keeps the detail log of every posted incident so later polls only have
+    to diff the log and edit the existing Discord message.
+
+    An incident is refreshed at most every refresh_interval seconds, and is
+    dropped once it leaves the CHP table or is older than max_age seconds.
+    """
+    def __init__(self, refresh_interval=120, max_age=3 * 60 * 60):
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.incidents = {}
+
+    def track(self, incident, message, summary):
+        if message is None:
+            return
+        tracked = TrackedIncident(incident, message, summary)
+        self.incidents[(tracked.center, tracked.number)] = tracked
+
+    def due(self, center_code, listed_numbers):
+        """
+        Returns the numbers of the center's incidents that need a refresh,
+        dropping the ones that are no longer listed or have expired.
+        """
+        now = time.monotonic()
+        due_numbers = set()
+        for key, tracked in list(self.incidents.items()):
+            if tracked.center != center_code:
+                continue
+            if tracked.number not in listed_numbers or now - tracked.first_seen > self.max_age:
+                del self.incidents[key]
+            elif now - tracked.last_refresh >= self.refresh_interval:
+                due_numbers.add(tracked.number)
+        return due_numbers
+
+    def apply(self, center_code, number, details):
+        """
+        Records a fresh detail log and returns the tracked incident if it
+        gained new lines, otherwise None.
+        """
+        tracked = self.incidents.get((center_code, number))
+        if tracked is None:
+            return None
+        tracked.last_refresh = time.monotonic()
+        added = appended_lines(tracked.details, details)
+        tracked.details = list(details)
+        if not added:
+            return None
+        tracked.updates.extend(added)
+        return tracked
+
+def render_message(tracked):
+    """
+    Builds the edited message: the original summary followed by the detail
+    lines CHP has added since it was posted.
+    """
+    if not tracked.updates:
+        return tracked.summary[:MAX_MESSAGE_LENGTH]
+    lines = [f"🔄 {line}" for line in tracked.updates]
+    content = tracked.summary + "\n\n**Updates:**\n" + "\n".join(lines)
+    # Keep the newest updates when the message would get too long
+    while len(content) > MAX_MESSAGE_LENGTH and len(lines) > 1:
+        lines.pop(0)
+        content = tracked.summary + "\n\n**Updates:**\n…\n" + "\n".join(lines)
+    return content[:MAX_MESSAGE_LENGTH]
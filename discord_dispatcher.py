@@ -0,0 +1,217 @@
+import asyncio
+import io
+import time
+import discord
+
+# Discord allows up to 10 embeds and 10 attachments per message
+MAX_EMBEDS = 10
+
+class RateBucket:
+    """
+    Client-side copy of a Discord rate-limit bucket: at most limit requests
+    per window seconds. A 429 pauses the bucket for its Retry-After.
+    """
+    def __init__(self, limit=5, window=5.0):
+        self.limit = limit
+        self.window = window
+        self.sent = []
+        self.paused_until = 0.0
+
+    def delay(self):
+        now = time.monotonic()
+        self.sent = [stamp for stamp in self.sent if now - stamp < self.window]
+        wait = self.paused_until - now
+        if len(self.sent) >= self.limit:
+            wait = max(wait, self.sent[0] + self.window - now)
+        return max(0.0, wait)
+
+    async def acquire(self):
+        wait = self.delay()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self.delay()
+        self.sent.append(time.monotonic())
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class SentMessage:
+    """
+    A Discord message shared by the posts coalesced into it. Edits replace
+    message, so every post sees the latest version.
+    """
+    def __init__(self, message):
+        self.message = message
+
+class Post:
+    """
+    Handle to one incident's part of a sent message. embed_index is None
+    when the incident was posted alone as plain content. label is its
+    marker on a composite map and image_bytes the map it was sent with.
+    """
+    def __init__(self, sent, embed_index=None, label=None, image_bytes=None):
+        self.sent = sent
+        self.embed_index = embed_index
+        self.label = label
+        self.image_bytes = image_bytes
+
+    @property
+    def message(self):
+        return self.sent.message
+
+class DiscordDispatcher:
+    """
+    Outbound queue between the bot and Discord.
+
+    Each channel has a FIFO queue, one sender task and a rate-limit bucket.
+    A post queued alone goes out as before, as plain content with its map
+    attached. Posts that are queued together when the bucket grants the
+    next send, including all that piled up while it was exhausted, are
+    merged into one message with an embed and map attachment per incident.
+    A burst therefore goes out at the rate limit without 429 stalls, and
+    callers only wait for their own post. Channel handles are resolved
+    once and cached.
+
+    With render_map, an async callable taking [(lon, lat, label), ...] and
+    returning PNG bytes, posts can pass a location instead of an image. A
+    merged message then carries one composite map with a numbered marker
+    per incident, and a lone post gets its map rendered on send.
+    """
+    def __init__(self, client, rate_limit=5, rate_window=5.0, render_map=None):
+        self.client = client
+        self.render_map = render_map
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.channels = {}
+        self.queues = {}
+        self.buckets = {}
+        self.tasks = {}
+        self.loop = None
+
+    async def channel(self, channel_id):
+        channel_id = int(channel_id)
+        if channel_id not in self.channels:
+            channel = self.client.get_channel(channel_id)
+            if channel is None:
+                channel = await self.client.fetch_channel(channel_id)
+            self.channels[channel_id] = channel
+        return self.channels[channel_id]
+
+    def bucket(self, key):
+        if key not in self.buckets:
+            self.buckets[key] = RateBucket(self.rate_limit, self.rate_window)
+        return self.buckets[key]
+
+    async def send(self, channel_id, text, image_bytes=None, filename="map.png", location=None):
+        """
+        Queues a post and waits until it is sent. Returns its Post.
+        location is (lon, lat), used when image_bytes is None.
+        """
+        channel_id = int(channel_id)
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # The GUI can restart the bot on a new event loop; queues and
+            # sender tasks of the old one are unusable
+            self.channels = {}
+            self.queues = {}
+            self.tasks = {}
+            self.loop = loop
+        if channel_id not in self.queues:
+            self.queues[channel_id] = asyncio.Queue()
+            self.tasks[channel_id] = asyncio.create_task(self._sender(channel_id))
+        future = loop.create_future()
+        self.queues[channel_id].put_nowait((text, image_bytes, filename, location, future))
+        return await future
+
+    async def edit(self, post, text):
+        """
+        Replaces the text of a post, keeping the other incidents of a merged message.
+        """
+        await self.bucket(("edit", post.message.channel.id)).acquire()
+        if post.embed_index is None:
+            post.sent.message = await post.message.edit(content=text)
+            return
+        embeds = post.message.embeds
+        embeds[post.embed_index].description = labelled(text, post.label)
+        post.sent.message = await post.message.edit(embeds=embeds)
+
+    async def stop(self):
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks = {}
+        self.queues = {}
+
+    async def _sender(self, channel_id):
+        queue = self.queues[channel_id]
+        bucket = self.bucket(("send", channel_id))
+        while True:
+            batch = [await queue.get()]
+            await bucket.acquire()
+            while len(batch) < MAX_EMBEDS and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                posts = await self._send_batch(channel_id, batch)
+            except Exception as e:
+                if isinstance(e, discord.HTTPException) and e.status == 429:
+                    bucket.pause(float(e.response.headers.get("Retry-After", self.rate_window)))
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (*_, future), post in zip(batch, posts):
+                if not future.done():
+                    future.set_result(post)
+
+    async def _render(self, points):
+        if not self.render_map or not points:
+            return None
+        try:
+            return await self.render_map(points)
+        except Exception as e:
+            print(f"Could not render the map for {len(points)} incident(s): {e}")
+            return None
+
+    async def _send_batch(self, channel_id, batch):
+        channel = await self.channel(channel_id)
+        if len(batch) == 1:
+            text, image_bytes, filename, location, _ = batch[0]
+            if image_bytes is None and location:
+                image_bytes = await self._render([(*location, None)])
+            if image_bytes:
+                message = await channel.send(content=text, file=discord.File(io.BytesIO(image_bytes), filename=filename))
+            else:
+                message = await channel.send(text)
+            return [Post(SentMessage(message), image_bytes=image_bytes)]
+
+        # Posts that only have a location share one composite map
+        labels = {}
+        points = []
+        for index, (_, image_bytes, _, location, _) in enumerate(batch):
+            if image_bytes is None and location:
+                labels[index] = len(points) + 1
+                points.append((*location, labels[index]))
+        composite = await self._render(points)
+        if composite is None:
+            labels = {}
+
+        embeds = []
+        files = []
+        images = []
+        for index, (text, image_bytes, filename, _, _) in enumerate(batch):
+            embed = discord.Embed(description=labelled(text, labels.get(index)))
+            if image_bytes:
+                name = f"{index}_{filename}"
+                files.append(discord.File(io.BytesIO(image_bytes), filename=name))
+                embed.set_image(url=f"attachment://{name}")
+            embeds.append(embed)
+            images.append(image_bytes or (composite if index in labels else None))
+        if composite is not None:
+            files.append(discord.File(io.BytesIO(composite), filename="incidents.png"))
+            embeds[min(labels)].set_image(url="attachment://incidents.png")
+        print(f"Coalesced {len(batch)} incidents into one message.")
+        sent = SentMessage(await channel.send(embeds=embeds, files=files))
+        return [Post(sent, index, labels.get(index), images[index]) for index in range(len(batch))]
+
+def labelled(text, label):
+    return f"**{label}.** {text}" if label else text
@@ -0,0 +1,35 @@
+import threading
+from collections import deque, namedtuple
+
+# Event kinds
+INCIDENT_DETECTED = "incident_detected"
+INCIDENT_POSTED = "incident_posted"
+ERROR = "error"
+STATS_DELTA = "stats_delta"
+
+Event = namedtuple("Event", ["kind", "data"])
+
+class EventQueue:
+    """
+    Thread-safe queue of bot events for the GUI.
+
+    The bot thread publishes, the GUI thread drains it on a timer, so
+    publishing never waits for the GUI. When nobody drains, as with the
+    headless bot, the oldest events are dropped beyond maxlen.
+    """
+    def __init__(self, maxlen=1000):
+        self.lock = threading.Lock()
+        self.events = deque(maxlen=maxlen)
+
+    def publish(self, kind, **data):
+        with self.lock:
+            self.events.append(Event(kind, data))
+
+    def drain(self):
+        """
+        Removes and returns every queued event, oldest first.
+        """
+        with self.lock:
+            events = list(self.events)
+            self.events.clear()
+        return events
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class RateLimiter:
+    """
+    Spaces calls at least min_interval seconds apart across threads.
+    Nominatim's usage policy allows one request per second.
+    """
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.min_interval
+        if delay > 0:
+            time.sleep(delay)
+
+class GeoCache:
+    """
+    Reverse-geocoding cache persisted to a JSON file.
+
+    Coordinates are rounded to `precision` decimals (3 is about 110 m), so
+    incidents on the same interchange share one entry. Entries expire after
+    ttl seconds and the least recently used ones are evicted beyond
+    max_entries. Misses go through a shared rate limiter.
+    """
+    def __init__(self, filename="geocode_cache.json", precision=3, max_entries=5000,
+                 ttl=30 * 24 * 60 * 60, limiter=None):
+        self.filename = filename
+        self.precision = precision
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.limiter = limiter or RateLimiter()
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def key(self, lat, lon):
+        return f"{round(lat, self.precision):.{self.precision}f},{round(lon, self.precision):.{self.precision}f}"
+
+    def lookup(self, lat, lon, fetch):
+        """
+        Returns the cached result for (lat, lon), or calls fetch(lat, lon)
+        once the rate limiter allows it and caches what it returns.
+        """
+        key = self.key(lat, lon)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry["stored"] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry["value"]
+            self.misses += 1
+
+        self.limiter.wait()
+        value = fetch(lat, lon)
+        with self.lock:
+            self.entries[key] = {"value": value, "stored": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self._save()
+        return value
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, "r") as file:
+                stored = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable geocode cache {self.filename}: {e}")
+            return
+        now = time.time()
+        # The file is written in LRU order, oldest first
+        for key, entry in stored.items():
+            if now - entry.get("stored", 0) < self.ttl:
+                self.entries[key] = entry
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _save(self):
+        temp_filename = f"{self.filename}.tmp"
+        with open(temp_filename, "w") as file:
+            json.dump(self.entries, file)
+        os.replace(temp_filename, self.filename)
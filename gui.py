@@ -1,129 +1,88 @@
-import os
 import sys
 import io
-import json
 import tkinter as tk
 from tkinter import ttk
 from PIL import Image, ImageTk
-from collections import defaultdict
-from datetime import datetime
+from collections import OrderedDict, deque
 import threading
 import asyncio
 import main  # Import the main.py module
+import events
+from analytics import IncidentAnalytics
 
 # --- Global Variables ---
 bot_thread = None
 bot_loop = None
 bot_running = False
-
-analytics_data = {
-    "total_accidents": 0,
-    "accidents_per_hour": defaultdict(int),
-    "most_frequent_location": defaultdict(int),
-    "accidents_by_severity": defaultdict(int),
-    "last_incident_time": None,
+# Map image of the latest post, delivered by INCIDENT_POSTED events
+latest_map_image = None
+
+# The decoded map and its scaled copies, rebuilt only when latest_map_image changes
+map_view = {
+    "source": None,
+    "image": None,
+    "preview": None,
+    "scaled": OrderedDict(),
+    "shown": None,
+    "resize_job": None,
 }
+SCALED_CACHE_SIZE = 8
+RESIZE_DEBOUNCE_MS = 150
 
-# --- Functions for Parsing and Processing Incidents ---
-def parse_incident_time(time_str):
-    """
-    Attempts to parse the given time string into a datetime object using multiple formats.
-    Returns a datetime object if successful, otherwise None.
-    """
-    formats = ["%Y-%m-%d %H:%M:%S", "%I:%M %p"]
-    for fmt in formats:
-        try:
-            return datetime.strptime(time_str, fmt)
-        except ValueError:
-            continue
-    print(f"Skipping invalid time format: {time_str}")
-    return None
-
-def process_incident_for_analytics(incident):
-    """
-    Updates analytics_data based on a single incident.
-    Extracts time and location information and increments corresponding counts.
-    """
-    time_str = incident.get("Time")
-    location = incident.get("Location")
+# Terminal output: lines kept in the widget (and buffered between flushes) and the flush period
+TERMINAL_MAX_LINES = 1000
+TERMINAL_FLUSH_MS = 1000
+# Output without a newline is cut into lines of at most this many characters
+TERMINAL_MAX_LINE_CHARS = 4096
 
-    if time_str:
-        time_obj = parse_incident_time(time_str)
-        if time_obj:
-            hour = time_obj.hour
-            analytics_data["accidents_per_hour"][hour] += 1
+# Rates over the last hour/day/week change with time alone, so they are
+# redrawn this often even without new incidents
+ANALYTICS_TICK_MS = 60000
 
-            # Update last incident time if this one is newer
-            if not analytics_data["last_incident_time"] or time_str > analytics_data["last_incident_time"]:
-                analytics_data["last_incident_time"] = time_str
+# How often the Tk loop drains bot events; the bot thread never calls into Tcl
+BOT_EVENT_POLL_MS = 100
 
-    if location:
-        analytics_data["most_frequent_location"][location] += 1
+# Columnar analytics over main.incident_store, refreshed incrementally
+incident_analytics = IncidentAnalytics(main.incident_store)
 
 # --- Analytics Handling ---
 def update_analytics_from_file():
     """
-    Reads previous_data.json file and updates the analytics data.
-    If file doesn't exist or is empty, it resets the analytics.
+    Folds incidents appended to main.incident_store since the last call into
+    the analytics and redraws the labels. Nothing is read when the log has
+    not grown, and the columns are only rebuilt after the history was cleared.
     """
-    filename = "previous_data.json"
-    if not os.path.exists(filename):
-        # If file doesn't exist or was just cleared, reset analytics
-        analytics_data.update({
-            "total_accidents": 0,
-            "accidents_per_hour": defaultdict(int),
-            "most_frequent_location": defaultdict(int),
-            "accidents_by_severity": defaultdict(int),
-            "last_incident_time": None,
-        })
-        update_analytics_display()
-        return
-
     try:
-        with open(filename, "r") as file:
-            data = json.load(file)
-
-        # Reset analytics and re-calculate
-        analytics_data.update({
-            "total_accidents": len(data),
-            "accidents_per_hour": defaultdict(int),
-            "most_frequent_location": defaultdict(int),
-            "accidents_by_severity": defaultdict(int),
-            "last_incident_time": None,
-        })
-
-        for incident in data:
-            process_incident_for_analytics(incident)
-
-        update_analytics_display()
+        if incident_analytics.refresh():
+            update_analytics_display()
     except Exception as e:
         print(f"Error reading analytics: {e}")
 
-def monitor_analytics_file():
-    """
-    Periodically updates analytics data from the file.
-    """
-    update_analytics_from_file()
-    root.after(5000, monitor_analytics_file)
+def tick_analytics():
+    update_analytics_display()
+    root.after(ANALYTICS_TICK_MS, tick_analytics)
 
 def update_analytics_display():
     """
     Updates the labels in the GUI to reflect the current analytics data.
     """
-    total_label.config(text=f"Total Accidents: {analytics_data['total_accidents']}")
-    last_incident = analytics_data['last_incident_time'] or "N/A"
+    metrics = incident_analytics.metrics()
+    total_label.config(text=f"Total Accidents: {metrics['total']}")
+    last_incident = (metrics['last_incident'] or "N/A").replace("T", " ")
     last_time_label.config(text=f"Last Incident Time: {last_incident}")
 
-    freq_locations = analytics_data["most_frequent_location"]
-    most_frequent_location = max(freq_locations, key=freq_locations.get, default="N/A")
+    most_frequent_location = metrics["locations"][0][0] if metrics["locations"] else "N/A"
     location_label.config(text=f"Most Frequent Location: {most_frequent_location}")
 
-    total_hours = len(analytics_data["accidents_per_hour"])
-    total_accidents = sum(analytics_data["accidents_per_hour"].values())
-    average_per_hour = total_accidents / total_hours if total_hours > 0 else 0.0
-    per_hour_label.config(text=f"Average Accidents per Hour: {average_per_hour:.2f}")
+    busiest_hour = metrics["busiest_hour"]
+    busiest = f" (busiest hour {busiest_hour:02d}:00)" if busiest_hour is not None else ""
+    per_hour_label.config(text=f"Average Accidents per Hour: {metrics['per_hour_average']:.2f}{busiest}")
 
-    severity_label.config(text="Accidents by Severity: None")
+    rates = metrics["rates"]
+    rates_label.config(text=f"Last 1h / 24h / 7d: {rates['1h']['count']} / {rates['24h']['count']} / {rates['7d']['count']}")
+
+    top_types = ", ".join(f"{name} ({count})" for name, count in metrics["types"][:3]) or "None"
+    severity_label.config(text=f"Accidents by Type: {top_types}")
 
 # --- Bot Control Functions ---
 def start_bot():
@@ -186,61 +145,144 @@ def update_status(message):
     status_label.config(text=message)
 
 # --- Image Display ---
-def show_latest_image():
+def fit_size(img_width, img_height, window_width, window_height):
+    """
+    Largest size with the image's aspect ratio that fits the window.
     """
-    Displays the latest map image (map.png) in the map_label widget.
+    img_aspect = img_width / img_height
+    window_aspect = window_width / window_height
+
+    if window_aspect > img_aspect:
+        new_height = window_height
+        new_width = int(new_height * img_aspect)
+    else:
+        new_width = window_width
+        new_height = int(new_width / img_aspect)
+    return max(1, new_width), max(1, new_height)
+
+def load_map_image():
+    """
+    Decodes latest_map_image once per new image, along with a half-size
+    copy used for quick previews while the window is being resized.
+    """
+    if map_view["source"] is not latest_map_image:
+        img = Image.open(io.BytesIO(latest_map_image)).convert("RGB")
+        map_view.update({
+            "source": latest_map_image,
+            "image": img,
+            "preview": img.reduce(2) if min(img.size) >= 400 else img,
+            "shown": None,
+        })
+        map_view["scaled"].clear()
+    return map_view["image"]
+
+def show_latest_image(fast=False):
+    """
+    Displays the map image of the latest post in the map_label widget.
     Automatically resizes the image to fit the current widget size.
+    Scaled images are cached per size; fast=True draws an uncached,
+    cheaply filtered preview instead of a new LANCZOS resize.
     """
-    img_path = "map.png"
-    if not os.path.exists(img_path):
+    if not latest_map_image:
         update_status("No map image found.")
         map_label.config(image='')
+        map_view["shown"] = None
         return
 
     try:
-        img = Image.open(img_path)
+        img = load_map_image()
         window_width = map_label.winfo_width()
         window_height = map_label.winfo_height()
 
+        size = img.size
         if window_width > 0 and window_height > 0:
-            img_aspect = img.width / img.height
-            window_aspect = window_width / window_height
-
-            if window_aspect > img_aspect:
-                new_height = window_height
-                new_width = int(new_height * img_aspect)
-            else:
-                new_width = window_width
-                new_height = int(new_width / img_aspect)
+            size = fit_size(img.width, img.height, window_width, window_height)
+
+        shown = map_view["shown"]
+        if shown and shown[0] == size and (fast or not shown[1]):
+            return
+
+        scaled = map_view["scaled"]
+        if size in scaled:
+            scaled.move_to_end(size)
+            img_tk = scaled[size]
+            is_preview = False
+        elif fast:
+            img_tk = ImageTk.PhotoImage(map_view["preview"].resize(size, Image.BILINEAR))
+            is_preview = True
+        else:
+            img_tk = ImageTk.PhotoImage(img if size == img.size else img.resize(size, Image.LANCZOS))
+            scaled[size] = img_tk
+            while len(scaled) > SCALED_CACHE_SIZE:
+                scaled.popitem(last=False)
+            is_preview = False
 
-            img = img.resize((new_width, new_height), Image.LANCZOS)
-
-        img_tk = ImageTk.PhotoImage(img)
         map_label.config(image=img_tk)
         map_label.image = img_tk
+        map_view["shown"] = (size, is_preview)
     except Exception as e:
         update_status(f"Error loading image: {e}")
         map_label.config(image='')
+        map_view["shown"] = None
 
-# --- Posted Message Update ---
-def update_posted_message():
+def on_map_resize(event):
     """
-    Periodically checks the main.latest_posted_message and updates the label.
+    Shows a quick preview on every resize step and the full-quality image
+    once the size has been stable for RESIZE_DEBOUNCE_MS.
     """
-    if main.latest_posted_message:
-        posted_message_label.config(text=main.latest_posted_message)
-    root.after(5000, update_posted_message)
+    if not latest_map_image:
+        return
+    if map_view["resize_job"]:
+        root.after_cancel(map_view["resize_job"])
+    show_latest_image(fast=True)
+    map_view["resize_job"] = root.after(RESIZE_DEBOUNCE_MS, finish_map_resize)
+
+def finish_map_resize():
+    map_view["resize_job"] = None
+    show_latest_image()
+
+# --- Bot Events ---
+def handle_bot_events():
+    """
+    Periodically drains main.event_queue and updates only the widgets each
+    event affects. An empty queue costs one lock and one length check.
+    """
+    global latest_map_image
+    posted = None
+    stats_changed = False
+    for bot_event in main.event_queue.drain():
+        data = bot_event.data
+        if bot_event.kind == events.INCIDENT_DETECTED:
+            incident = data["incident"]
+            update_status(f"New incident: {incident.get('Type')} at {incident.get('Location')}")
+        elif bot_event.kind == events.INCIDENT_POSTED:
+            posted = data
+        elif bot_event.kind == events.ERROR:
+            update_status(f"Error: {data['message']}")
+        elif bot_event.kind == events.STATS_DELTA:
+            stats_changed = True
+    if stats_changed:
+        update_analytics_from_file()
+    # Only the newest post of a burst is shown
+    if posted:
+        posted_message_label.config(text=posted["summary"])
+        if posted["image_bytes"]:
+            latest_map_image = posted["image_bytes"]
+            show_latest_image()
+    root.after(BOT_EVENT_POLL_MS, handle_bot_events)
 
 # --- Clear Data ---
 def clear_data():
     """
-    Clears the previous_data.json file, resets analytics and clears the posted message.
+    Clears the incident history, resets analytics and clears the posted message.
     """
+    global latest_map_image
     main.clear_json_file()  # Clears the file content in main
     # Reset analytics
     update_analytics_from_file()
     # Clear posted message
     main.latest_posted_message = None
+    latest_map_image = None
     posted_message_label.config(text="")
     update_status("Data cleared and stats reset.")
 
@@ -248,31 +290,68 @@ def clear_data():
 class TextRedirector(io.StringIO):
     """
     Redirects stdout to a text widget. Buffers output and flushes periodically.
+
+    write() is called from both the bot thread and the Tk thread, so lines
+    go into a lock-protected ring of at most max_lines; older unflushed
+    lines are dropped, since the widget keeps no more than that anyway.
+    An unterminated line is flushed as a line once it reaches max_line_chars.
     """
-    def __init__(self, text_widget):
+    def __init__(self, text_widget, max_lines=TERMINAL_MAX_LINES, max_line_chars=TERMINAL_MAX_LINE_CHARS):
         super().__init__()
         self.text_widget = text_widget
-        self.buffer = ""
+        self.max_lines = max_lines
+        self.max_line_chars = max_line_chars
+        self.lock = threading.Lock()
+        self.lines = deque(maxlen=max_lines)
+        self.partial = []
+        self.partial_size = 0
 
     def write(self, message):
-        self.buffer += message
+        with self.lock:
+            *complete, rest = message.split("\n")
+            if complete:
+                self.partial.append(complete[0])
+                complete[0] = "".join(self.partial)
+                self.lines.extend(complete)
+                self.partial = []
+                self.partial_size = 0
+            if rest:
+                self.partial.append(rest)
+                self.partial_size += len(rest)
+                if self.partial_size >= self.max_line_chars:
+                    self.lines.append("".join(self.partial))
+                    self.partial = []
+                    self.partial_size = 0
+        return len(message)
 
     def flush(self):
         pass
 
+    def take_lines(self):
+        """
+        Removes and returns the complete lines written since the last call.
+        """
+        with self.lock:
+            lines = list(self.lines)
+            self.lines.clear()
+        return lines
+
 def update_terminal():
     """
-    Periodically checks if there's new output in our StringIO buffer
-    and writes it into the Text widget.
+    Periodically writes the lines buffered by stdout_redirector into the
+    Text widget in one insert, then trims the widget to TERMINAL_MAX_LINES.
     """
-    new_content = stdout_redirector.buffer
-    if new_content:
+    lines = stdout_redirector.take_lines()
+    if lines:
         terminal_text.configure(state='normal')
-        terminal_text.insert(tk.END, new_content)
+        terminal_text.insert(tk.END, "\n".join(lines) + "\n")
+        # The widget always ends with an empty line after the last newline
+        line_count = int(terminal_text.index('end-1c').split('.')[0]) - 1
+        if line_count > TERMINAL_MAX_LINES:
+            terminal_text.delete('1.0', f"{line_count - TERMINAL_MAX_LINES + 1}.0")
         terminal_text.configure(state='disabled')
         terminal_text.see(tk.END)
-        stdout_redirector.buffer = ""
-    root.after(1000, update_terminal)
+    root.after(TERMINAL_FLUSH_MS, update_terminal)
 
 # --- GUI Setup ---
 root = tk.Tk()
@@ -328,7 +407,10 @@ location_label.pack(anchor="w")
 per_hour_label = tk.Label(analytics_frame, text="Average Accidents per Hour: 0.00", font=("Arial", 12), bg="#F5F5F5", fg="#555")
 per_hour_label.pack(anchor="w")
 
-severity_label = tk.Label(analytics_frame, text="Accidents by Severity: None", font=("Arial", 12), bg="#F5F5F5", fg="#555")
+rates_label = tk.Label(analytics_frame, text="Last 1h / 24h / 7d: 0 / 0 / 0", font=("Arial", 12), bg="#F5F5F5", fg="#555")
+rates_label.pack(anchor="w")
+
+severity_label = tk.Label(analytics_frame, text="Accidents by Type: None", font=("Arial", 12), bg="#F5F5F5", fg="#555")
 severity_label.pack(anchor="w")
 
 # Posted Message Label
@@ -366,11 +448,12 @@ stdout_redirector = TextRedirector(terminal_text)
 sys.stdout = stdout_redirector
 
 # Bind events and start periodic updates
-root.bind("<Configure>", lambda event: show_latest_image())
+# Only the map label's own size changes matter, not window moves or other widgets
+map_label.bind("<Configure>", on_map_resize)
 
 update_analytics_from_file()
-monitor_analytics_file()
-update_posted_message()
+tick_analytics()
+handle_bot_events()
 update_terminal()
 
 root.mainloop()
@@ -0,0 +1,241 @@
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+# Records saved before multi-center polling have no 'Center'
+DEFAULT_CENTER = "BCCC"
+
+class IncidentStore:
+    """
+    Append-only incident history.
+
+    Each incident is one JSON line in log_path, so saving a new incident is a
+    single append. In-memory indexes map (center, number), location and the
+    'Recorded' timestamp to byte offsets in the log. Readers seek straight to
+    the records they need instead of loading the whole history.
+
+    The indexes are snapshotted to index_path once the appends since the
+    last snapshot reach compact_every or a quarter of the store, whichever is
+    more. A snapshot costs O(n), so this keeps appends amortized O(1). On
+    open only the part of the log written after the snapshot is scanned.
+    """
+    def __init__(self, log_path="incidents.jsonl", index_path="incidents.idx.json",
+                 legacy_path="previous_data.json", compact_every=100):
+        self.log_path = log_path
+        self.index_path = index_path
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        # Bumped by clear(), so incremental readers know to start over
+        self.generation = 0
+        self._reset_index()
+        self._open(legacy_path)
+
+    # --- Opening and indexing ---
+    def _reset_index(self):
+        self.log_size = 0
+        self.numbers = {}
+        self.locations = {}
+        self.times = []
+        self.offsets = []
+        self.appends_since_compact = 0
+
+    def _open(self, legacy_path):
+        if not os.path.exists(self.log_path):
+            open(self.log_path, "ab").close()
+            self._import_legacy(legacy_path)
+            return
+        self._repair_tail()
+        self._load_index()
+        self._scan_from(self.log_size)
+
+    def _import_legacy(self, legacy_path):
+        """
+        One-time import of the old previous_data.json list.
+        """
+        if not legacy_path or not os.path.exists(legacy_path):
+            return
+        try:
+            with open(legacy_path, "r") as file:
+                records = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Could not import {legacy_path}: {e}")
+            return
+        for record in records:
+            self.append(record, stamp=False)
+        self.compact()
+
+    def _repair_tail(self):
+        # A crash during an append can leave half a line at the end of the log
+        with open(self.log_path, "rb+") as file:
+            data_end = file.seek(0, os.SEEK_END)
+            if data_end == 0:
+                return
+            file.seek(max(0, data_end - 65536))
+            tail = file.read()
+            if tail.endswith(b"\n"):
+                return
+            last_newline = tail.rfind(b"\n")
+            keep = data_end - len(tail) + last_newline + 1 if last_newline != -1 else 0
+            file.truncate(keep)
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r") as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            return
+        if snapshot.get("log_size", 0) > os.path.getsize(self.log_path):
+            return  # The log was replaced or truncated, rebuild from scratch
+        self.log_size = snapshot["log_size"]
+        self.numbers = snapshot["numbers"]
+        self.locations = snapshot["locations"]
+        self.times = [tuple(entry) for entry in snapshot["times"]]
+        self.offsets = snapshot["offsets"]
+
+    def _scan_from(self, offset):
+        with open(self.log_path, "rb") as file:
+            file.seek(offset)
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    self._index(record, offset)
+                offset += len(line)
+        self.log_size = offset
+
+    @staticmethod
+    def number_key(center, number):
+        return f"{center}/{number}"
+
+    def _index(self, record, offset):
+        self.offsets.append(offset)
+        if record.get("No."):
+            key = self.number_key(record.get("Center", DEFAULT_CENTER), record["No."])
+            self.numbers.setdefault(key, []).append(offset)
+        if record.get("Location"):
+            self.locations.setdefault(record["Location"], []).append(offset)
+        if record.get("Recorded"):
+            self.times.append((record["Recorded"], offset))
+
+    # --- Writing ---
+    def append(self, record, stamp=True):
+        """
+        Appends one incident, stamping 'Recorded' with the current local
+        time unless the record already has one or stamp is False.
+        """
+        record = dict(record)
+        if stamp and "Recorded" not in record:
+            record["Recorded"] = datetime.now().isoformat(timespec="seconds")
+        line = (json.dumps(record) + "\n").encode()
+        with self.lock:
+            with open(self.log_path, "ab") as file:
+                file.write(line)
+            self._index(record, self.log_size)
+            self.log_size += len(line)
+            self.appends_since_compact += 1
+            if self.appends_since_compact >= max(self.compact_every, len(self.offsets) // 4):
+                self._write_snapshot()
+        return record
+
+    def compact(self):
+        with self.lock:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        snapshot = {
+            "log_size": self.log_size,
+            "offsets": self.offsets,
+            "numbers": self.numbers,
+            "locations": self.locations,
+            "times": self.times,
+        }
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(snapshot, file)
+        os.replace(temp_path, self.index_path)
+        self.appends_since_compact = 0
+
+    def clear(self):
+        with self.lock:
+            open(self.log_path, "wb").close()
+            self._reset_index()
+            self._write_snapshot()
+            self.generation += 1
+
+    # --- Reading ---
+    def __len__(self):
+        return len(self.offsets)
+
+    def _read(self, offsets):
+        if not offsets:
+            return []
+        with open(self.log_path, "rb") as file:
+            records = []
+            for offset in offsets:
+                file.seek(offset)
+                records.append(json.loads(file.readline()))
+            return records
+
+    def by_number(self, number, center=DEFAULT_CENTER):
+        with self.lock:
+            offsets = list(self.numbers.get(self.number_key(center, number), []))
+        return self._read(offsets)
+
+    def by_location(self, location):
+        with self.lock:
+            offsets = list(self.locations.get(location, []))
+        return self._read(offsets)
+
+    def between(self, start, end):
+        """
+        Incidents recorded in [start, end], given as datetimes or ISO strings.
+        """
+        start = start.isoformat() if isinstance(start, datetime) else start
+        end = end.isoformat() if isinstance(end, datetime) else end
+        with self.lock:
+            low = bisect_left(self.times, (start,))
+            high = bisect_right(self.times, (end, float("inf")))
+            offsets = [offset for _, offset in self.times[low:high]]
+        return self._read(offsets)
+
+    def read_from(self, offset=0):
+        """
+        Returns (records, next_offset) for everything appended at or after
+        the byte offset, so readers can follow the log incrementally.
+        """
+        with self.lock:
+            end = self.log_size
+        if offset >= end:
+            return [], offset
+        with open(self.log_path, "rb") as file:
+            file.seek(offset)
+            data = file.read(end - offset)
+        records = []
+        for line in data.splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records, end
+
+    def __iter__(self):
+        """
+        Streams every incident in the order it was stored.
+        """
+        with self.lock:
+            end = self.log_size
+        with open(self.log_path, "rb") as file:
+            while file.tell() < end:
+                line = file.readline()
+                if not line:
+                    break
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
@@ -0,0 +1,176 @@
+import re
+from functools import lru_cache
+
+# CHP radio codes as they appear in incident types and detail logs
+CHP_CODES = {
+    "1039": "notify",
+    "1124": "abandoned vehicle",
+    "1125": "traffic hazard",
+    "1126": "disabled vehicle",
+    "1141": "ambulance",
+    "1144": "fatality",
+    "1166": "signal out",
+    "1179": "collision with ambulance responding",
+    "1180": "collision with major injuries",
+    "1181": "collision with minor injuries",
+    "1182": "collision without injuries",
+    "1183": "collision with unknown injuries",
+    "1184": "traffic control",
+    "1185": "tow truck",
+    "20001": "hit and run with injuries",
+    "20002": "hit and run without injuries",
+    "23103": "reckless driver",
+    "23152": "DUI",
+}
+
+# Multi-word detail phrases, matched before single words
+DETAIL_PHRASES = {
+    "OTURNED VEH": "overturned vehicle",
+    "VEH ON ITS ROOF": "vehicle on its roof",
+    "MC VS GROUND": "solo motorcycle crash",
+    "MC VS VEH": "motorcycle hit by a vehicle",
+    "VEH VS PED": "vehicle hit a pedestrian",
+    "PED VS VEH": "pedestrian hit by a vehicle",
+    "VEH VS WALL": "vehicle into a wall",
+    "VEH VS POLE": "vehicle into a pole",
+    "VEH VS TREE": "vehicle into a tree",
+    "VEH FIRE": "vehicle on fire",
+    "CAR FIRE": "car on fire",
+    "ALL LNS BLKD": "all lanes blocked",
+    "ALL LNS BLKG": "all lanes blocked",
+    "LANES REOPENED": "lanes reopened",
+    "SIG ALERT": "Sig Alert issued",
+    "NO INJ": "no injuries",
+    "UNKN INJ": "unknown injuries",
+    "MAJ INJ": "major injuries",
+    "MIN INJ": "minor injuries",
+}
+
+ABBREVIATIONS = {
+    "ADVS": "advises",
+    "BLKD": "blocked",
+    "BLKG": "blocking",
+    "CD": "center divider",
+    "COLLISION": "collision",
+    "ENRT": "en route",
+    "EB": "eastbound",
+    "FWY": "freeway",
+    "INJ": "injuries",
+    "INJS": "injuries",
+    "JEO": "just east of",
+    "JNO": "just north of",
+    "JSO": "just south of",
+    "JWO": "just west of",
+    "LHS": "left shoulder",
+    "LN": "lane",
+    "LNS": "lanes",
+    "MC": "motorcycle",
+    "NB": "northbound",
+    "OTURNED": "overturned",
+    "PED": "pedestrian",
+    "RHS": "right shoulder",
+    "RP": "caller",
+    "SB": "southbound",
+    "SEMI": "semi truck",
+    "TC": "collision",
+    "TRFC": "traffic",
+    "TRK": "truck",
+    "UNKN": "unknown",
+    "UNK": "unknown",
+    "VEH": "vehicle",
+    "VEHS": "vehicles",
+    "VS": "vs.",
+    "WB": "westbound",
+}
+ABBREVIATIONS.update(CHP_CODES)
+
+# Detail lines worth repeating in the summary contain one of these words
+NOTABLE_WORDS = {"BLKG", "BLKD", "FIRE", "PED", "1144", "ROOF", "OTURNED", "REOPENED", "SIG", "SEMI"}
+
+# First matching keyword picks the emoji of an incident type
+TYPE_EMOJIS = [
+    (("1144", "FATAL"), "🚨"),
+    (("FIRE",), "🔥"),
+    (("HIT AND RUN", "20001", "20002"), "🏃💨"),
+    (("COLLISION", "1179", "1180", "1181", "1182", "1183"), "🚗💥"),
+    (("ANIMAL",), "🐄"),
+    (("SIGNAL", "1166"), "🚦"),
+    (("DISABLED", "ABANDONED", "1124", "1126"), "🚙"),
+    (("DUI", "RECKLESS", "23152", "23103"), "🚓"),
+    (("HAZARD", "1125"), "⚠️"),
+]
+
+PHRASE_PATTERN = re.compile(r"\b(" + "|".join(re.escape(phrase) for phrase in sorted(DETAIL_PHRASES, key=len, reverse=True)) + r")\b")
+CODE_PART_PATTERN = re.compile(r"^\d{4,5}$")
+
+def expand(text):
+    """
+    Spells out the phrases, codes and abbreviations of an upper-cased CHP
+    text. Unknown words are lower-cased.
+    """
+    pieces = []
+    position = 0
+    for match in PHRASE_PATTERN.finditer(text):
+        pieces.extend(_expand_words(text[position:match.start()]))
+        pieces.append(DETAIL_PHRASES[match.group(1)])
+        position = match.end()
+    pieces.extend(_expand_words(text[position:]))
+    return " ".join(pieces)
+
+def _expand_words(text):
+    return [ABBREVIATIONS.get(word, word.lower()) for word in text.split()]
+
+@lru_cache(maxsize=256)
+def decode_type(incident_type):
+    """
+    ("Trfc Collision-1141 Enrt") -> ("Traffic collision, ambulance en route", "🚗💥🚑").
+    Bare codes are only spelled out when the type has no text of its own.
+    """
+    upper = (incident_type or "").upper()
+    parts = [part.strip() for part in upper.split("-") if part.strip()]
+    text_parts = [part for part in parts if not CODE_PART_PATTERN.match(part)]
+    description = ", ".join(expand(part) for part in (text_parts or parts)) or "traffic incident"
+    emoji = next((emoji for keywords, emoji in TYPE_EMOJIS if any(keyword in upper for keyword in keywords)), "🚨")
+    if "1141" in upper or "1179" in upper:
+        emoji += "🚑"
+    return description[0].upper() + description[1:], emoji
+
+@lru_cache(maxsize=1024)
+def decode_detail(line):
+    """
+    Spelled-out detail line, or None if it is routine (units, tows, notes).
+    """
+    upper = line.upper()
+    if not NOTABLE_WORDS.intersection(upper.split()) and not PHRASE_PATTERN.search(upper):
+        return None
+    return expand(upper)
+
+def summarize(data, max_notes=2):
+    """
+    One-sentence summary of an incident built from lookup tables, without
+    any network call.
+    """
+    description, emoji = decode_type(data.get("Type"))
+    sentence = f"{emoji} {description} at {data.get('Location') or 'an unknown location'}"
+    # The geocoder fills in "N/A" for parts it could not resolve
+    city = data.get("City") if data.get("City") != "N/A" else None
+    neighborhood = data.get("Neighborhood") if data.get("Neighborhood") != "N/A" else None
+    area = city or data.get("Area")
+    if neighborhood and neighborhood != area:
+        area = f"{neighborhood}, {area}" if area else neighborhood
+    if area:
+        sentence += f" in {area}"
+
+    details = data.get("Details") or []
+    if isinstance(details, str):
+        details = [details]
+    notes = []
+    for line in details:
+        note = decode_detail(line)
+        if note and note not in notes:
+            notes.append(note)
+            if len(notes) == max_notes:
+                break
+    if notes:
+        sentence += ": " + "; ".join(notes)
+    return sentence + "."
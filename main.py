@@ -1,11 +1,26 @@
 import asyncio
 import discord
-from traffic_scraper import get_merged_data
-from openai import OpenAI
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from traffic_scraper import (
+    ComCenter, DEFAULT_CENTER, configure_geocoder, create_session, listed_numbers, locate_incident,
+    poll_centers_async, refresh_details,
+)
 from dotenv import load_dotenv, find_dotenv
 import os
 import json
-from map_generator import save_map_image
+from map_generator import fetch_composite_map_image, fetch_map_image, prefetch_tiles
+from detail_tracker import DetailTracker, render_message
+from pipeline import IncidentPipeline
+from discord_dispatcher import DiscordDispatcher
+import events
+from summarizer import Summarizer
+import local_summary
+from scheduler import PollScheduler
+from incident_store import IncidentStore
+from dedupe_index import DedupeIndex, incident_date
+from datetime import datetime, timedelta
+from collections import Counter
 
 # Initialize Discord client
 intents = discord.Intents.default()
@@ -16,132 +31,340 @@ load_dotenv(find_dotenv())
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 DISCORD_CHANNEL_ID = os.getenv("DISCORD_CHANNEL_ID")
 MAP_ACCESS_TOKEN = os.getenv("MAP_ACCESS_TOKEN")
+# Comma-separated CHP communication centers to monitor, e.g. "BCCC,LACC,OCCC"
+CHP_COM_CENTERS = [code.strip() for code in os.getenv("CHP_COM_CENTERS", DEFAULT_CENTER).split(",") if code.strip()]
+# Reverse geocoding: "online" (Nominatim), "offline" or "hybrid" with a local GeoJSON gazetteer
+configure_geocoder(os.getenv("GEOCODER_MODE", "online"), os.getenv("GAZETTEER_PATH"))
+# Maps: "mapbox" (static image API) or "local" (composed from cached tiles with Pillow)
+MAP_RENDERER = os.getenv("MAP_RENDERER", "mapbox").lower()
+# Number of incident hotspots whose tiles the local renderer downloads at startup
+MAP_PREFETCH_HOTSPOTS = int(os.getenv("MAP_PREFETCH_HOTSPOTS", "50"))
+# "llm" asks the model and falls back to the local summary, "local" only uses the local one
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "llm").lower()
+# Seconds to wait for an LLM summary before using the local one
+SUMMARY_DEADLINE = float(os.getenv("SUMMARY_DEADLINE", "8"))
+# Pipeline sizing: concurrent enrichments, concurrent posts and the depth of each stage queue
+PIPELINE_ENRICH_WORKERS = int(os.getenv("PIPELINE_ENRICH_WORKERS", "4"))
+# Publish workers wait on the dispatcher, which sends in queue order; several
+# waiting at once is what lets a burst be merged into one message
+PIPELINE_PUBLISH_WORKERS = int(os.getenv("PIPELINE_PUBLISH_WORKERS", "10"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "16"))
+# Poll interval in seconds at average activity, and the bounds of the adaptive interval
+POLL_BASE_INTERVAL = float(os.getenv("POLL_BASE_INTERVAL", "30"))
+POLL_FLOOR = float(os.getenv("POLL_FLOOR", "10"))
+POLL_CEILING = float(os.getenv("POLL_CEILING", "180"))
+# Days of history behind the poll scheduler's arrival profile and the map hotspots
+HISTORY_WINDOW_DAYS = int(os.getenv("HISTORY_WINDOW_DAYS", "30"))
 
 # Track posted incidents to avoid duplicates
 posted_incidents = set()
 
-# Store the latest posted message for the GUI
+# Rate-limit-aware outbound queue; merges posts that queue up during a burst
+# and gives them one composite map
+dispatcher = DiscordDispatcher(
+    client,
+    render_map=lambda points: run_blocking(fetch_composite_map_image, points, MAP_ACCESS_TOKEN, renderer=MAP_RENDERER),
+)
+
+# Incidents of a multi-incident poll; their map is rendered by the dispatcher
+composite_map_keys = set()
+
+# Store the latest posted message and its map image bytes for the GUI
 latest_posted_message = None
+latest_map_image = None
+# Bot events (detected, posted, errors, stats) pushed to the GUI thread
+event_queue = events.EventQueue()
+
+# One long-lived async OpenAI client with a summary cache; OPENAI_BASE_URL
+# can point it at any OpenAI-compatible server
+summarizer = Summarizer(api_key=os.getenv("GPT_KEY"), base_url=os.getenv("OPENAI_BASE_URL"), deadline=SUMMARY_DEADLINE)
+
+# Append-only incident history; imports previous_data.json on first start
+incident_store = IncidentStore()
+
+# Posted incidents keyed on (center, date, number), kept across restarts
+dedupe_index = DedupeIndex()
+
+# Detail logs of posted incidents, used to edit their messages with updates
+detail_tracker = DetailTracker()
+
+# Bounded pool for blocking disk and network calls made from the event loop.
+# Each enrichment runs up to three of them at once (geocode, map, summary).
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=3 * PIPELINE_ENRICH_WORKERS + 2, thread_name_prefix="bot-io")
+
+# Event loop lag in seconds, measured by monitor_loop_lag
+loop_lag_stats = {"last": 0.0, "max": 0.0}
+LOOP_LAG_WARNING = 0.25
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs a blocking function on IO_EXECUTOR and awaits its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(IO_EXECUTOR, lambda: func(*args, **kwargs))
+
+async def monitor_loop_lag(interval=1.0):
+    """
+    Measures how late the event loop wakes up from a fixed sleep. Anything
+    above a few milliseconds means a callback is blocking the loop.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        loop_lag_stats["last"] = lag
+        loop_lag_stats["max"] = max(loop_lag_stats["max"], lag)
+        if lag > LOOP_LAG_WARNING:
+            print(f"Event loop lag: {lag * 1000:.0f} ms")
 
 def clear_json_file(filename="previous_data.json"):
     """
-    Clears the contents of the specified JSON file.
+    Clears the incident history and the contents of the specified JSON file.
     """
     with open(filename, "w") as file:
         json.dump([], file, indent=4)
-        
-def load_data_from_file(filename="previous_data.json"):
-    if os.path.exists(filename):
-        with open(filename, "r") as file:
-            return json.load(file)
-    return []
-
-def save_data_to_file(data, filename="previous_data.json"):
-    with open(filename, "w") as file:
-        json.dump(data, file, indent=4)
+    incident_store.clear()
+    event_queue.publish(events.STATS_DELTA, cleared=True)
 
 async def summarize_data(data):
     global latest_gpt_description
-    client_gpt = OpenAI(api_key=os.getenv("GPT_KEY"))
-    prompt = (
-        "Write a one-sentence summary with emojis for a traffic incident using the following details:\n"
-        f"- Type: {data.get('Type')}\n"
-        f"- Report No.: {data.get('Incident No.', 'N/A')}\n"
-        f"- Time: {data.get('Time')}\n"
-        f"- Location: {data.get('Location')}\n"
-        f"- Details: {data.get('Details', 'No additional details available')}\n"
-        "Make it concise, engaging, and include related emojis."
-    )
-
-    response = client_gpt.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "You are a traffic reporter creating engaging one-sentence summaries for traffic incidents."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=100,
-        temperature=0.7
-    )
-    latest_gpt_description = response.choices[0].message.content
+    if SUMMARY_MODE == "local":
+        latest_gpt_description = local_summary.summarize(data)
+    else:
+        latest_gpt_description = await summarizer.summarize(data)
     return latest_gpt_description
 
 def get_latest_description():
     return latest_gpt_description
 
-async def post_to_discord(channel_id, message, image_path=None):
-    channel = client.get_channel(int(channel_id))
-    if channel:
-        if image_path and os.path.exists(image_path):
-            with open(image_path, 'rb') as image_file:
-                file = discord.File(image_file)
-                await channel.send(content=message, file=file)
-        else:
-            await channel.send(message)
-    else:
+def read_image(image_path):
+    if not os.path.exists(image_path):
+        return None
+    with open(image_path, 'rb') as image_file:
+        return image_file.read()
+
+async def post_to_discord(channel_id, message, image_path=None, image_bytes=None, location=None):
+    """
+    Sends through the dispatcher and returns the Post handle used for later
+    edits. Without an image, location (lon, lat) lets the dispatcher render one.
+    """
+    if image_bytes is None and image_path:
+        image_bytes = await run_blocking(read_image, image_path)
+    try:
+        return await dispatcher.send(channel_id, message, image_bytes, os.path.basename(image_path or 'map.png'), location)
+    except (discord.NotFound, discord.Forbidden, discord.InvalidData):
         print(f"Could not find the specified channel with ID {channel_id}.")
+        return None
+
+async def update_tracked_incidents(centers, session):
+    """
+    Re-reads the detail log of posted incidents that are due for a refresh
+    and edits their Discord message when CHP has appended new lines.
+    """
+    for center in centers.values():
+        numbers = detail_tracker.due(center.code, listed_numbers(center))
+        if not numbers:
+            continue
+        fresh_details = await run_blocking(refresh_details, center, numbers, session)
+        for number, details in fresh_details.items():
+            tracked = detail_tracker.apply(center.code, number, details)
+            if tracked is None:
+                continue
+            try:
+                await dispatcher.edit(tracked.message, render_message(tracked))
+                print(f"Updated incident {number} with {tracked.updates[-1]!r}")
+            except discord.HTTPException as e:
+                print(f"Could not edit the message for incident {number}: {e}")
 
 @client.event
 async def on_ready():
     print(f"Logged in as {client.user}")
+    asyncio.create_task(monitor_loop_lag())
     asyncio.create_task(traffic_monitor())
 
-async def traffic_monitor():
-    global posted_incidents, latest_posted_message
-    all_previous_data = load_data_from_file()  # Load existing data from file
+def incident_map(lon, lat):
+    """
+    Map image of an incident, or None when there is none to be had: the
+    local renderer misses a tile it has no token to download, or Mapbox
+    fails. The post then carries the location for the dispatcher to retry.
+    """
+    try:
+        return fetch_map_image(lon, lat, MAP_ACCESS_TOKEN, renderer=MAP_RENDERER)
+    except (LookupError, requests.RequestException) as e:
+        print(f"No map for the incident at {lon}, {lat}: {e}")
+        return None
 
-    # Build a set of existing incident numbers for quick duplicate checking
-    existing_incident_numbers = {entry.get("No.") for entry in all_previous_data if "No." in entry}
+async def enrich_incident(incident):
+    """
+    Enrich stage: the map image runs concurrently with geocoding followed by
+    the summary, which names the City and Neighborhood the geocode adds.
+    Incidents of a burst skip their own map and share a composite one.
+    """
+    lon = incident.get("Longitude")
+    lat = incident.get("Latitude")
+    key = IncidentPipeline.key(incident)
+    if key in composite_map_keys:
+        # Taken out right away, so a failed enrichment leaves no key behind
+        composite_map_keys.discard(key)
+        map_task = asyncio.sleep(0)
+    else:
+        map_task = run_blocking(incident_map, lon, lat)
 
-    while True:
-        try:
-            print("Fetching merged data...")
-            current_data = get_merged_data()
-            print(f"Current data: {current_data}")
+    async def locate_and_summarize():
+        await run_blocking(locate_incident, incident)
+        return await summarize_data(incident)
 
-            incident_id = (
-                current_data.get("Incident No.") or
-                f"{current_data.get('Time')}-{current_data.get('Location')}"
-            )
+    image_bytes, summary = await asyncio.gather(map_task, locate_and_summarize())
+    print(f"Summary: {summary}")
+    return incident, summary, image_bytes
 
-            current_incident_no = current_data.get("No.")
+async def publish_incident(enriched, centers):
+    """
+    Publish stage: posts the enriched incident and records it as posted.
+    """
+    global latest_posted_message, latest_map_image
+    incident, summary, image_bytes = enriched
+    location = None
+    if incident.get("Longitude") is not None and incident.get("Latitude") is not None:
+        location = (incident["Longitude"], incident["Latitude"])
+    message = await post_to_discord(DISCORD_CHANNEL_ID, summary, image_bytes=image_bytes, location=location)
 
-            # Check for duplicates
-            if current_incident_no in existing_incident_numbers:
-                print("Duplicate incident detected. Skipping...")
-                await asyncio.sleep(30)
-                continue
+    # The GUI shows the latest post and its map straight from memory
+    latest_posted_message = summary
+    latest_map_image = message.image_bytes if message else image_bytes
+
+    # Mark as posted and follow its detail log
+    detail_tracker.track(incident, message, summary)
+    posted_incidents.add(incident_id_of(incident))
+    # The dedupe index appends to its log file and may compact it
+    await run_blocking(centers[incident["Center"]].mark_seen, incident)
+    record = await run_blocking(incident_store.append, incident)
+    print(f"Data saved to {incident_store.log_path}: {incident}")
+    event_queue.publish(events.INCIDENT_POSTED, incident=record, summary=summary, image_bytes=latest_map_image)
+    event_queue.publish(events.STATS_DELTA, appended=1)
+
+def incident_id_of(incident):
+    return (
+        incident.get("Incident No.") or
+        f"{incident.get('Time')}-{incident.get('Location')}"
+    )
+
+def seed_dedupe_index():
+    """
+    Fills a freshly created dedupe index from the incidents recorded within
+    its window, read through the store's timestamp index.
+    """
+    start = datetime.now() - timedelta(days=dedupe_index.window_days)
+    for record in incident_store.between(start, datetime.now()):
+        recorded = datetime.fromisoformat(record["Recorded"])
+        day = incident_date(record.get("Time"), recorded)
+        dedupe_index.add(record.get("Center", DEFAULT_CENTER), record.get("No."), day)
 
-            if current_data and incident_id not in posted_incidents:
-                print("New incident detected. Preparing to post...")
+def recent_incidents(days=HISTORY_WINDOW_DAYS):
+    """
+    Incidents recorded in the last days days, read through the store's
+    timestamp index instead of scanning the whole log.
+    """
+    now = datetime.now()
+    return incident_store.between(now - timedelta(days=days), now)
+
+def hotspots(count):
+    """
+    The count most frequent recent incident locations, rounded to about 110 m.
+    """
+    counts = Counter()
+    for record in recent_incidents():
+        if record.get("Longitude") is not None and record.get("Latitude") is not None:
+            counts[(round(record["Longitude"], 3), round(record["Latitude"], 3))] += 1
+    return [point for point, _ in counts.most_common(count)]
 
-                # Generate the map image
-                lon = current_data.get("Longitude")
-                lat = current_data.get("Latitude")
-                image_path = 'map.png'
-                save_map_image(lon, lat, MAP_ACCESS_TOKEN, image_path)
+def prefetch_hotspot_tiles():
+    try:
+        downloaded = prefetch_tiles(hotspots(MAP_PREFETCH_HOTSPOTS), MAP_ACCESS_TOKEN)
+        print(f"Prefetched {downloaded} map tiles for incident hotspots.")
+    except Exception as e:
+        print(f"Tile prefetch failed: {e}")
 
-                # Summarize the data
-                summary = await summarize_data(current_data)
-                print(f"Summary: {summary}")
+async def traffic_monitor():
+    # All centers share the persistent dedupe index for quick duplicate checking
+    if dedupe_index.is_new:
+        await run_blocking(seed_dedupe_index)
+    await run_blocking(dedupe_index.expire)
+    centers = {code: ComCenter(code, dedupe_index) for code in CHP_COM_CENTERS}
+    if MAP_RENDERER == "local" and MAP_ACCESS_TOKEN:
+        asyncio.create_task(run_blocking(prefetch_hotspot_tiles))
+    session = create_session(len(centers))
 
-                # Post to Discord
-                await post_to_discord(DISCORD_CHANNEL_ID, summary, image_path)
+    # scrape -> enrich -> publish, with the scrape stage being this loop
+    pipeline = IncidentPipeline(
+        enrich_incident,
+        lambda enriched: publish_incident(enriched, centers),
+        enrich_workers=PIPELINE_ENRICH_WORKERS,
+        publish_workers=PIPELINE_PUBLISH_WORKERS,
+        queue_size=PIPELINE_QUEUE_SIZE,
+    )
+    pipeline.start()
 
-                # Update the global variable with the latest posted message
-                latest_posted_message = summary
+    # Poll faster at historically busy hours and right after new incidents
+    history = await run_blocking(recent_incidents)
+    scheduler = PollScheduler(history, POLL_BASE_INTERVAL, POLL_FLOOR, POLL_CEILING)
 
-                # Mark as posted and update the file
-                posted_incidents.add(incident_id)
-                existing_incident_numbers.add(current_incident_no)
-                all_previous_data.append(current_data)
-                save_data_to_file(all_previous_data)
-                print(f"Data saved to previous_data.json: {current_data}")
+    expiry_day = datetime.now().date()
+    while True:
+        try:
+            # CHP numbers restart daily, so once a day drop keys older than the window
+            if datetime.now().date() != expiry_day:
+                expiry_day = datetime.now().date()
+                await run_blocking(dedupe_index.expire)
+
+            print("Fetching new incidents...")
+            # Geocoding happens in the enrich stage, concurrently with the map and summary.
+            # Incidents still in the pipeline are skipped before their detail postbacks.
+            new_incidents = await poll_centers_async(
+                list(centers.values()), session, geocode=False, in_flight=frozenset(pipeline.in_flight),
+            )
+            print(f"Current data: {new_incidents}")
+            if any(center.last_error for center in centers.values()):
+                scheduler.on_error()
             else:
+                scheduler.on_success()
+
+            await update_tracked_incidents(centers, session)
+
+            if not new_incidents:
                 print("No new data or duplicate incident.")
+            else:
+                print(f"{len(new_incidents)} new incident(s) detected. Preparing to post...")
+
+            batch = []
+            for current_data in new_incidents:
+                if incident_id_of(current_data) in posted_incidents:
+                    print("Duplicate incident detected. Skipping...")
+                    continue
+                if IncidentPipeline.key(current_data) not in pipeline.in_flight:
+                    batch.append(current_data)
+            # A burst is summarized with one request; the enrich stage picks the results up
+            if SUMMARY_MODE != "local":
+                summarizer.prefetch(batch)
+            if len(batch) > 1:
+                composite_map_keys.update(IncidentPipeline.key(current_data) for current_data in batch)
+            submitted = []
+            for current_data in batch:
+                if await pipeline.submit(current_data):
+                    submitted.append(current_data)
+            # Only incidents that entered the pipeline count as arrivals
+            if submitted:
+                scheduler.on_new_incidents(submitted)
+                for current_data in submitted:
+                    event_queue.publish(events.INCIDENT_DETECTED, incident=current_data)
         except Exception as e:
             print(f"Error: {e}")
-        await asyncio.sleep(30)
+            event_queue.publish(events.ERROR, message=str(e))
+            scheduler.on_error()
+        interval = scheduler.next_interval()
+        print(f"Next poll in {interval:.0f}s")
+        await asyncio.sleep(interval)
 
 if __name__ == "__main__":
-    clear_json_file()
     client.run(DISCORD_TOKEN)
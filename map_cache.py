@@ -0,0 +1,182 @@
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+class MapCache:
+    """
+    Two-level LRU cache of rendered map images keyed by (lat, lon, zoom, style).
+
+    Coordinates are rounded to `precision` decimals (4 is about 11 m) and the
+    map is rendered for the rounded point, so every incident at the same
+    spot shares one image. The newest memory_entries images stay in memory
+    and up to disk_entries are kept as PNG files in directory. A disk hit
+    touches the file, so the least recently used files are evicted first,
+    also across restarts.
+    """
+    def __init__(self, directory="map_cache", precision=4, memory_entries=64, disk_entries=2000):
+        self.directory = directory
+        self.precision = precision
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.disk = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".png"):
+                files.append((entry.stat().st_mtime, entry.name[:-4]))
+        for _, key in sorted(files):
+            self.disk[key] = None
+
+    def quantize(self, lat, lon):
+        return round(lat, self.precision), round(lon, self.precision)
+
+    def key(self, lat, lon, zoom, style):
+        lat, lon = self.quantize(lat, lon)
+        return f"{style}_{zoom}_{lat:.{self.precision}f}_{lon:.{self.precision}f}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, lat, lon, zoom, style, render):
+        """
+        Returns the image bytes for the key, calling render(lat, lon) with
+        the quantized coordinates on a miss.
+        """
+        key = self.key(lat, lon, zoom, style)
+        with self.lock:
+            image_bytes = self.memory.get(key)
+            if image_bytes is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return image_bytes
+        image_bytes = self._read_disk(key)
+        if image_bytes is not None:
+            with self.lock:
+                self.hits += 1
+                self._remember(key, image_bytes)
+            return image_bytes
+
+        with self.lock:
+            self.misses += 1
+        image_bytes = render(*self.quantize(lat, lon))
+        with self.lock:
+            self._remember(key, image_bytes)
+        self._write_disk(key, image_bytes)
+        return image_bytes
+
+    def _remember(self, key, image_bytes):
+        self.memory[key] = image_bytes
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        with self.lock:
+            if key not in self.disk:
+                return None
+            self.disk.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                image_bytes = file.read()
+            os.utime(path)
+            return image_bytes
+        except OSError:
+            with self.lock:
+                self.disk.pop(key, None)
+            return None
+
+    def _write_disk(self, key, image_bytes):
+        if not self.directory:
+            return
+        temp_path = f"{self._path(key)}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(image_bytes)
+        os.replace(temp_path, self._path(key))
+        with self.lock:
+            self.disk[key] = None
+            self.disk.move_to_end(key)
+            evicted = []
+            while len(self.disk) > self.disk_entries:
+                evicted.append(self.disk.popitem(last=False)[0])
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "memory_entries": len(self.memory),
+                "disk_entries": len(self.disk),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+class TileCache:
+    """
+    On-disk cache of map tiles under directory/style/z/x/y.png.
+
+    Missing tiles are downloaded with the fetch callable given to get or
+    store. The most recently used tiles are kept decoded in memory, so
+    rendering a map around a known hotspot needs neither the network nor
+    PNG decoding.
+    """
+    def __init__(self, directory="tile_cache", memory_entries=64):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+
+    def _path(self, style, z, x, y):
+        return os.path.join(self.directory, style, str(z), str(x), f"{y}.png")
+
+    def has(self, style, z, x, y):
+        return (style, z, x, y) in self.memory or os.path.exists(self._path(style, z, x, y))
+
+    def get(self, style, z, x, y, fetch=None):
+        """
+        Returns the tile as a decoded Pillow image, calling
+        fetch(style, z, x, y) for its PNG bytes if it is not on disk.
+        """
+        key = (style, z, x, y)
+        with self.lock:
+            tile = self.memory.get(key)
+            if tile is not None:
+                self.memory.move_to_end(key)
+                return tile
+        path = self._path(style, z, x, y)
+        if not os.path.exists(path):
+            if fetch is None:
+                raise LookupError(f"Tile {style}/{z}/{x}/{y} is not cached")
+            self.store(style, z, x, y, fetch(style, z, x, y))
+        with Image.open(path) as image:
+            tile = image.convert("RGB")
+        with self.lock:
+            self.memory[key] = tile
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+        return tile
+
+    def store(self, style, z, x, y, tile_bytes):
+        path = self._path(style, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(tile_bytes)
+        os.replace(temp_path, path)
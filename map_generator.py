@@ -1,31 +1,211 @@
 import requests
 import datetime
+import io
+import math
 import pytz
 from dotenv import load_dotenv
 import os
+from PIL import Image, ImageDraw, ImageFont
+from map_cache import MapCache, TileCache
 
 load_dotenv()
 
 MAPBOX_BASE_URL = "https://api.mapbox.com/styles/v1/mapbox/"
+# Rendered maps by (quantized lat/lon, zoom, style), in memory and in map_cache/
+MAP_CACHE = MapCache(os.getenv("MAP_CACHE_DIR", "map_cache"))
+
+# Raster tiles of the same styles for the local renderer; 512 px tiles at @2x are 1024 px
+TILE_URL = "https://api.mapbox.com/styles/v1/mapbox/{style}/tiles/512/{z}/{x}/{y}@2x?access_token={access_token}"
+TILE_SIZE = 512
+TILE_CACHE = TileCache(os.getenv("TILE_CACHE_DIR", "tile_cache"))
+PIN_COLOR = (0xff, 0x42, 0x42)
+# Seconds a Mapbox request may wait to connect or between bytes read
+REQUEST_TIMEOUT = 15.0
 
 def generate_mapbox_url(lon, lat, access_token, zoom=16, bearing=0, pitch=60, size='500x500@2x', dark_mode=False):
     style = "traffic-night-v2" if dark_mode else "traffic-day-v2"
     url = f"{MAPBOX_BASE_URL}{style}/static/pin-s+ff4242({lon},{lat})/{lon},{lat},{zoom},{bearing},{pitch}/{size}?access_token={access_token}"
     return url
 
+def generate_composite_mapbox_url(points, access_token, size='500x500@2x', dark_mode=False, padding=60):
+    """
+    One static map with a pin per (lon, lat, label). The 'auto' viewport
+    fits every pin; labels are numbers 0-99 or letters.
+    """
+    style = "traffic-night-v2" if dark_mode else "traffic-day-v2"
+    overlays = ",".join(
+        f"pin-s-{label}+ff4242({lon},{lat})" if label is not None else f"pin-s+ff4242({lon},{lat})"
+        for lon, lat, label in points
+    )
+    url = f"{MAPBOX_BASE_URL}{style}/static/{overlays}/auto/{size}?padding={padding}&access_token={access_token}"
+    return url
+
 def is_after_sunset(lon, lat):
     local_timezone = pytz.timezone('America/Los_Angeles')
     now = datetime.datetime.now(local_timezone)
     sunset = datetime.datetime(now.year, now.month, now.day, 19, 0, 0, tzinfo=local_timezone)
     return now > sunset
 
-def save_map_image(lon, lat, access_token, filename='map.png'):
+def fetch_map_image(lon, lat, access_token, zoom=16, cache=MAP_CACHE, renderer="mapbox"):
+    """
+    Returns the PNG bytes of the map around (lon, lat). Hotspots that were
+    rendered before come from the cache instead of Mapbox. renderer="local"
+    composes the map from cached tiles instead of the static image API.
+    """
     dark_mode = is_after_sunset(lon, lat)
-    url = generate_mapbox_url(lon, lat, access_token, dark_mode=dark_mode)
-    response = requests.get(url)
+    style = "traffic-night-v2" if dark_mode else "traffic-day-v2"
+
+    def render(lat, lon):
+        if renderer == "local":
+            return render_local_map([(lon, lat, None)], access_token, zoom=zoom, dark_mode=dark_mode)
+        url = generate_mapbox_url(lon, lat, access_token, zoom=zoom, dark_mode=dark_mode)
+        response = requests.get(url, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+
+    if cache is None:
+        return render(lat, lon)
+    if renderer == "local":
+        style = f"local-{style}"
+    return cache.get(lat, lon, zoom, style, render)
+
+def fetch_composite_map_image(points, access_token, renderer="mapbox"):
+    """
+    PNG bytes of one map showing every (lon, lat, label) point. A single
+    point gets the regular, cached incident map.
+    """
+    if len(points) == 1:
+        lon, lat, _ = points[0]
+        return fetch_map_image(lon, lat, access_token, renderer=renderer)
+    dark_mode = is_after_sunset(*points[0][:2])
+    if renderer == "local":
+        return render_local_map(points, access_token, zoom=None, dark_mode=dark_mode)
+    url = generate_composite_mapbox_url(points, access_token, dark_mode=dark_mode)
+    response = requests.get(url, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()
+    return response.content
+
+# --- Local renderer ---
+def world_pixel(lon, lat, zoom, scale=2):
+    """
+    Web Mercator pixel position of (lon, lat) in the world map at zoom.
+    """
+    world_size = TILE_SIZE * scale * 2 ** zoom
+    sin_lat = min(max(math.sin(math.radians(lat)), -0.9999), 0.9999)
+    x = (lon + 180) / 360 * world_size
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * world_size
+    return x, y
+
+def fit_zoom(points, size=500, padding=60, max_zoom=16):
+    """
+    Highest zoom at which every (lon, lat, label) point fits inside the
+    padded viewport, like the static API's 'auto' position.
+    """
+    pixels = [world_pixel(lon, lat, 0, 1) for lon, lat, _ in points]
+    span = max(
+        max(x for x, _ in pixels) - min(x for x, _ in pixels),
+        max(y for _, y in pixels) - min(y for _, y in pixels),
+    )
+    if span == 0:
+        return max_zoom
+    return max(0, min(max_zoom, math.floor(math.log2((size - 2 * padding) / span))))
+
+def tile_fetcher(access_token):
+    def fetch(style, z, x, y):
+        response = requests.get(TILE_URL.format(style=style, z=z, x=x, y=y, access_token=access_token),
+                                timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+    return fetch
+
+def viewport_tiles(center_x, center_y, zoom, size=500, scale=2):
+    """
+    (x, y) of every tile covering a size x size viewport centered on the
+    world pixel (center_x, center_y).
+    """
+    tile_px = TILE_SIZE * scale
+    half = size * scale / 2
+    tile_count = 2 ** zoom
+    first_x, last_x = math.floor((center_x - half) / tile_px), math.floor((center_x + half - 1) / tile_px)
+    first_y, last_y = math.floor((center_y - half) / tile_px), math.floor((center_y + half - 1) / tile_px)
+    return [
+        (x, y)
+        for y in range(max(0, first_y), min(tile_count - 1, last_y) + 1)
+        for x in range(first_x, last_x + 1)
+    ]
+
+def draw_pin(draw, x, y, label, scale):
+    """
+    Small teardrop marker with its tip at (x, y), like Mapbox's pin-s.
+    """
+    radius = 8 * scale
+    cx, cy = x, y - 2.3 * radius
+    draw.polygon([(cx - radius * 0.8, cy + radius * 0.6), (cx + radius * 0.8, cy + radius * 0.6), (x, y)],
+                 fill=PIN_COLOR)
+    draw.ellipse([cx - radius, cy - radius, cx + radius, cy + radius], fill=PIN_COLOR,
+                 outline=(255, 255, 255), width=scale)
+    if label is not None:
+        font = ImageFont.load_default(size=int(radius * 1.3))
+        draw.text((cx, cy), str(label), fill=(255, 255, 255), font=font, anchor="mm")
+
+def render_local_map(points, access_token=None, zoom=16, size=500, scale=2, dark_mode=False,
+                     padding=60, tile_cache=TILE_CACHE):
+    """
+    Renders a size x size@scale PNG of the (lon, lat, label) points from
+    cached raster tiles of the day or night traffic style, with the same
+    pins as the static API. zoom=None fits the viewport to the points.
+    Without an access token, every tile must already be cached.
+
+    Raster tiles are flat, so the map is drawn top-down rather than with
+    the static map's 60 degree pitch.
+    """
+    style = "traffic-night-v2" if dark_mode else "traffic-day-v2"
+    if zoom is None:
+        zoom = fit_zoom(points, size, padding)
+    pixels = [world_pixel(lon, lat, zoom, scale) for lon, lat, _ in points]
+    center_x = (min(x for x, _ in pixels) + max(x for x, _ in pixels)) / 2
+    center_y = (min(y for _, y in pixels) + max(y for _, y in pixels)) / 2
+    width = size * scale
+    left = center_x - width / 2
+    top = center_y - width / 2
+    tile_px = TILE_SIZE * scale
+    fetch = tile_fetcher(access_token) if access_token else None
+
+    image = Image.new("RGB", (width, width))
+    for x, y in viewport_tiles(center_x, center_y, zoom, size, scale):
+        tile = tile_cache.get(style, zoom, x % 2 ** zoom, y, fetch)
+        image.paste(tile, (round(x * tile_px - left), round(y * tile_px - top)))
+
+    draw = ImageDraw.Draw(image)
+    for (x, y), (_, _, label) in zip(pixels, points):
+        draw_pin(draw, x - left, y - top, label, scale)
+    buffer = io.BytesIO()
+    # Fast zlib level; the tiles are already compressed PNGs so level 6 gains little
+    image.save(buffer, "PNG", compress_level=1)
+    return buffer.getvalue()
+
+def prefetch_tiles(points, access_token, zoom=16, size=500, scale=2, tile_cache=TILE_CACHE):
+    """
+    Downloads the day and night tiles around each (lon, lat) hotspot that
+    are not cached yet, so the local renderer can draw them offline.
+    Returns the number of tiles downloaded.
+    """
+    fetch = tile_fetcher(access_token)
+    downloaded = 0
+    for lon, lat in points:
+        center_x, center_y = world_pixel(lon, lat, zoom, scale)
+        for x, y in viewport_tiles(center_x, center_y, zoom, size, scale):
+            x %= 2 ** zoom
+            for style in ("traffic-day-v2", "traffic-night-v2"):
+                if not tile_cache.has(style, zoom, x, y):
+                    tile_cache.store(style, zoom, x, y, fetch(style, zoom, x, y))
+                    downloaded += 1
+    return downloaded
+
+def save_map_image(lon, lat, access_token, filename='map.png'):
+    image_bytes = fetch_map_image(lon, lat, access_token)
     with open(filename, 'wb') as file:
-        file.write(response.content)
+        file.write(image_bytes)
     print(f"Map image saved as {filename}")
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+import json
+import math
+from collections import defaultdict
+
+# Nominatim address keys produced for each gazetteer feature kind
+KIND_KEYS = {
+    "city": "city",
+    "town": "city",
+    "neighbourhood": "neighbourhood",
+    "neighborhood": "neighbourhood",
+}
+
+class OfflineGeocoder:
+    """
+    Reverse geocoder over a local gazetteer of city and neighbourhood
+    boundaries, answering without any network access.
+
+    The gazetteer is a GeoJSON FeatureCollection of Polygon/MultiPolygon
+    features with "name" and "kind" ("city" or "neighbourhood") properties.
+    Features are indexed on a grid of cell_size degrees. Each feature also
+    keeps its edges bucketed by latitude band, so the point-in-polygon test
+    only looks at the few edges crossing the point's band.
+    """
+    def __init__(self, features, cell_size=0.01):
+        self.cell_size = cell_size
+        self.features = []
+        self.grid = defaultdict(list)
+        for feature in features:
+            self._add(feature)
+        # Smaller features first, so nested areas win over the ones around them
+        for cell in self.grid.values():
+            cell.sort(key=lambda index: self.features[index]["area"])
+
+    @classmethod
+    def from_file(cls, filename, cell_size=0.01):
+        with open(filename, "r", encoding="utf-8") as file:
+            collection = json.load(file)
+        return cls(collection.get("features", []), cell_size)
+
+    def _cell(self, value):
+        return math.floor(value / self.cell_size)
+
+    def _add(self, feature):
+        properties = feature.get("properties") or {}
+        key = KIND_KEYS.get(str(properties.get("kind", "")).lower())
+        geometry = feature.get("geometry") or {}
+        if key is None or not properties.get("name"):
+            return
+        if geometry.get("type") == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry.get("type") == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            return
+
+        bands = defaultdict(list)
+        min_lon = min_lat = math.inf
+        max_lon = max_lat = -math.inf
+        for polygon in polygons:
+            for ring in polygon:
+                for start, end in zip(ring, ring[1:] + ring[:1]):
+                    lon1, lat1, lon2, lat2 = start[0], start[1], end[0], end[1]
+                    if lat1 == lat2:
+                        continue
+                    for band in range(self._cell(min(lat1, lat2)), self._cell(max(lat1, lat2)) + 1):
+                        bands[band].append((lon1, lat1, lon2, lat2))
+                    min_lon, max_lon = min(min_lon, lon1, lon2), max(max_lon, lon1, lon2)
+                    min_lat, max_lat = min(min_lat, lat1, lat2), max(max_lat, lat1, lat2)
+        if not bands:
+            return
+
+        index = len(self.features)
+        self.features.append({
+            "key": key,
+            "name": properties["name"],
+            "bbox": (min_lon, min_lat, max_lon, max_lat),
+            "area": (max_lon - min_lon) * (max_lat - min_lat),
+            "bands": dict(bands),
+        })
+        for x in range(self._cell(min_lon), self._cell(max_lon) + 1):
+            for y in range(self._cell(min_lat), self._cell(max_lat) + 1):
+                self.grid[(x, y)].append(index)
+
+    def _contains(self, feature, lat, lon):
+        min_lon, min_lat, max_lon, max_lat = feature["bbox"]
+        if not (min_lon <= lon <= max_lon and min_lat <= lat <= max_lat):
+            return False
+        inside = False
+        # Even-odd ray cast towards the east, which also handles holes
+        for lon1, lat1, lon2, lat2 in feature["bands"].get(self._cell(lat), ()):
+            if (lat1 > lat) != (lat2 > lat):
+                if lon < lon1 + (lat - lat1) * (lon2 - lon1) / (lat2 - lat1):
+                    inside = not inside
+        return inside
+
+    def reverse(self, lat, lon):
+        """
+        Returns an address dict with the same keys Nominatim uses
+        ('neighbourhood', 'city'), or None when no boundary contains the point.
+        """
+        address = {}
+        for index in self.grid.get((self._cell(lon), self._cell(lat)), ()):
+            feature = self.features[index]
+            if feature["key"] in address:
+                continue
+            if self._contains(feature, lat, lon):
+                address[feature["key"]] = feature["name"]
+                if len(address) == 2:
+                    break
+        return address or None
@@ -0,0 +1,76 @@
+import asyncio
+
+class IncidentPipeline:
+    """
+    Two async stages fed by the scraper: enrich, then publish.
+
+    Each stage has a bounded queue and its own number of workers. When the
+    publish queue is full the enrich workers wait, and when the enrich
+    queue is full submit() waits, so a burst cannot pile up unbounded work.
+    Incidents are keyed by (Center, No.) and a key stays in flight until
+    published, so a poll that runs meanwhile cannot submit it twice. If a
+    stage fails the key is released and the next poll retries the incident.
+    """
+    def __init__(self, enrich, publish, enrich_workers=4, publish_workers=1, queue_size=16):
+        self.enrich = enrich
+        self.publish = publish
+        self.enrich_workers = enrich_workers
+        self.publish_workers = publish_workers
+        self.enrich_queue = asyncio.Queue(maxsize=queue_size)
+        self.publish_queue = asyncio.Queue(maxsize=queue_size)
+        self.in_flight = set()
+        self.tasks = []
+
+    @staticmethod
+    def key(incident):
+        return (incident.get("Center"), incident.get("No."))
+
+    def start(self):
+        self.tasks = (
+            [asyncio.create_task(self._enrich_worker()) for _ in range(self.enrich_workers)] +
+            [asyncio.create_task(self._publish_worker()) for _ in range(self.publish_workers)]
+        )
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def submit(self, incident):
+        """
+        Queues an incident for enrichment. Returns False if it is already in flight.
+        """
+        key = self.key(incident)
+        if key in self.in_flight:
+            return False
+        self.in_flight.add(key)
+        await self.enrich_queue.put((key, incident))
+        return True
+
+    async def join(self):
+        await self.enrich_queue.join()
+        await self.publish_queue.join()
+
+    async def _enrich_worker(self):
+        while True:
+            key, incident = await self.enrich_queue.get()
+            try:
+                enriched = await self.enrich(incident)
+                await self.publish_queue.put((key, enriched))
+            except Exception as e:
+                print(f"Error enriching incident {key[1]}: {e}")
+                self.in_flight.discard(key)
+            finally:
+                self.enrich_queue.task_done()
+
+    async def _publish_worker(self):
+        while True:
+            key, enriched = await self.publish_queue.get()
+            try:
+                await self.publish(enriched)
+            except Exception as e:
+                print(f"Error publishing incident {key[1]}: {e}")
+            finally:
+                self.in_flight.discard(key)
+                self.publish_queue.task_done()
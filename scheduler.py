@@ -0,0 +1,71 @@
+import random
+import time
+from datetime import datetime
+import pytz
+
+# CHP reports incident times in Pacific time
+LOCAL_TIMEZONE = pytz.timezone('America/Los_Angeles')
+
+def incident_hour(incident):
+    """
+    Hour of day (0-23) of an incident's CHP 'Time' such as "2:59 PM", or None.
+    """
+    try:
+        return datetime.strptime(incident.get("Time") or "", "%I:%M %p").hour
+    except ValueError:
+        return None
+
+class PollScheduler:
+    """
+    Picks the delay before the next poll.
+
+    The base interval applies to an hour of day with average activity. Busier
+    hours of the historical arrival profile poll proportionally faster and
+    quiet hours slower. For boost_duration seconds after a new incident
+    the scheduler polls at the floor, since incidents tend to arrive in
+    clusters. Consecutive errors back off exponentially with jitter.
+    Every delay stays within [floor, ceiling].
+    """
+    def __init__(self, history=(), base_interval=30, floor=10, ceiling=180, boost_duration=120):
+        self.base_interval = base_interval
+        self.floor = floor
+        self.ceiling = ceiling
+        self.boost_duration = boost_duration
+        # Start every hour at one arrival so hours without history are not
+        # treated as impossible
+        self.hourly_counts = [1] * 24
+        self.boost_until = 0.0
+        self.errors = 0
+        self.record_arrivals(history)
+
+    def record_arrivals(self, incidents):
+        for incident in incidents:
+            hour = incident_hour(incident)
+            if hour is not None:
+                self.hourly_counts[hour] += 1
+
+    def on_new_incidents(self, incidents):
+        self.record_arrivals(incidents)
+        self.boost_until = time.monotonic() + self.boost_duration
+
+    def on_success(self):
+        self.errors = 0
+
+    def on_error(self):
+        self.errors += 1
+
+    def hourly_interval(self, hour):
+        mean_count = sum(self.hourly_counts) / 24
+        interval = self.base_interval * mean_count / self.hourly_counts[hour]
+        return min(self.ceiling, max(self.floor, interval))
+
+    def next_interval(self, now=None):
+        if self.errors:
+            # The ceiling applies long before the cap; without it a float
+            # interval overflows after about a thousand errors
+            delay = min(self.ceiling, self.base_interval * 2 ** min(self.errors - 1, 16))
+            return max(self.floor, random.uniform(delay / 2, delay))
+        if time.monotonic() < self.boost_until:
+            return self.floor
+        hour = (now or datetime.now(LOCAL_TIMEZONE)).hour
+        return self.hourly_interval(hour)
@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from openai import AsyncOpenAI
+import local_summary
+
+SYSTEM_PROMPT = "You are a traffic reporter creating engaging one-sentence summaries for traffic incidents."
+CODE_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$")
+NUMBERED_LINE_PATTERN = re.compile(r"^\s*\d+[.)]\s*")
+
+def incident_prompt_lines(data):
+    # Only what fingerprint() covers, so a cached summary fits every incident
+    # that shares it
+    return (
+        f"- Type: {data.get('Type')}\n"
+        f"- Location: {data.get('Location')}\n"
+        f"- Details: {data.get('Details', 'No additional details available')}\n"
+    )
+
+def fingerprint(data):
+    """
+    Normalized (type, location, details) hash. Incidents that only differ in
+    number, time or letter case share a summary.
+    """
+    def normalize(value):
+        return " ".join(str(value or "").lower().split())
+    details = data.get("Details") or []
+    if isinstance(details, str):
+        details = [details]
+    key = "\x1f".join([normalize(data.get("Type")), normalize(data.get("Location"))] + [normalize(line) for line in details])
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+class Summarizer:
+    """
+    Summarizes incidents over one long-lived AsyncOpenAI client.
+
+    Summaries are cached by fingerprint with LRU eviction. summarize_batch
+    asks for several incidents in one request and splits the reply, and
+    summarize calls for incidents of an in-flight batch wait for it instead
+    of sending their own request. A request that misses its deadline or
+    fails falls back to the local summary function (local_summary.summarize
+    by default).
+
+    base_url points the client at another OpenAI-compatible server, such as
+    a local stand-in for testing.
+    """
+    def __init__(self, api_key=None, base_url=None, model="gpt-4o-mini", deadline=8.0,
+                 cache_size=256, fallback=local_summary.summarize):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.deadline = deadline
+        self.cache_size = cache_size
+        self.fallback = fallback
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.batches = set()
+        self.client = None
+        self.client_loop = None
+
+    def _client(self):
+        # The underlying HTTP pool belongs to one event loop; the GUI can
+        # restart the bot on a new loop
+        loop = asyncio.get_running_loop()
+        if self.client is None or self.client_loop is not loop:
+            self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+            self.client_loop = loop
+        return self.client
+
+    def _remember(self, key, summary):
+        self.cache[key] = summary
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def _complete(self, prompt, max_tokens):
+        response = await asyncio.wait_for(
+            self._client().chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=max_tokens,
+                temperature=0.7
+            ),
+            timeout=self.deadline,
+        )
+        return response.choices[0].message.content
+
+    async def summarize(self, data):
+        key = fingerprint(data)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if key in self.pending:
+            # A failed batch leaves the fallback to the waiting caller, as
+            # the incident has usually been geocoded by then
+            summary = await asyncio.shield(self.pending[key])
+            return summary or self.fallback(data)
+
+        prompt = (
+            "Write a one-sentence summary with emojis for a traffic incident using the following details:\n"
+            + incident_prompt_lines(data) +
+            "Make it concise, engaging, and include related emojis."
+        )
+        try:
+            summary = await self._complete(prompt, 100)
+        except Exception as e:
+            print(f"Summary request failed ({e!r}), using the local summary.")
+            return self.fallback(data)
+        self._remember(key, summary)
+        return summary
+
+    def _uncached(self, incidents):
+        todo = {}
+        for data in incidents:
+            key = fingerprint(data)
+            if key not in self.cache and key not in self.pending:
+                todo[key] = data
+        return todo
+
+    def _start_batch(self, todo):
+        # Futures are registered before any await, so summarize() calls made
+        # right after this find them and wait for the batch
+        loop = asyncio.get_running_loop()
+        for key in todo:
+            self.pending[key] = loop.create_future()
+        task = asyncio.create_task(self._request_batch(todo))
+        self.batches.add(task)
+        task.add_done_callback(self.batches.discard)
+        return task
+
+    def prefetch(self, incidents):
+        """
+        Starts one batch request for the uncached incidents without waiting
+        for it. Later summarize() calls for them share its result.
+        """
+        todo = self._uncached(incidents)
+        if len(todo) > 1:
+            self._start_batch(todo)
+
+    async def summarize_batch(self, incidents):
+        """
+        Summarizes several incidents with one request and returns the
+        summaries in order. Cached incidents are not sent again.
+        """
+        todo = self._uncached(incidents)
+        results = await self._start_batch(todo) if len(todo) > 1 else {}
+        summaries = []
+        for data in incidents:
+            key = fingerprint(data)
+            if key in results:
+                summaries.append(results[key] or self.fallback(data))
+            else:
+                summaries.append(await self.summarize(data))
+        return summaries
+
+    async def _request_batch(self, todo):
+        prompt = (
+            f"Write a one-sentence summary with emojis for each of the following {len(todo)} traffic incidents.\n\n"
+            + "\n".join(f"Incident {number}:\n{incident_prompt_lines(data)}" for number, data in enumerate(todo.values(), 1))
+            + f"\nMake each one concise, engaging, and include related emojis. Reply with only a JSON array of "
+            f"{len(todo)} strings, in the same order as the incidents."
+        )
+        try:
+            replies = split_batch_reply(await self._complete(prompt, 100 * len(todo)), len(todo))
+        except Exception as e:
+            print(f"Batch summary request failed ({e!r}), using local summaries.")
+            replies = [None] * len(todo)
+        results = {}
+        for key, reply in zip(todo, replies):
+            if reply:
+                self._remember(key, reply)
+            results[key] = reply
+            self.pending.pop(key).set_result(reply)
+        return results
+
+def split_batch_reply(reply, count):
+    """
+    Splits a batch reply into count summaries. Accepts a JSON array,
+    optionally fenced, or one numbered line per incident. Missing entries
+    are None.
+    """
+    text = CODE_FENCE_PATTERN.sub("", reply.strip())
+    try:
+        items = json.loads(text)
+        if not isinstance(items, list):
+            items = []
+    except ValueError:
+        items = [NUMBERED_LINE_PATTERN.sub("", line) for line in text.splitlines() if line.strip()]
+    items = [str(item).strip() or None for item in items[:count]]
+    return items + [None] * (count - len(items))
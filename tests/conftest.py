@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main and traffic_scraper keep their history, dedupe log and caches in the
+# working directory, so tests run from a scratch one
+os.chdir(tempfile.mkdtemp(prefix="traffic-bot-tests-"))
@@ -0,0 +1,29 @@
+import random
+from datetime import datetime
+
+from analytics import IncidentAnalytics
+
+def records(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        {
+            "Time": f"{rng.randrange(1, 13)}:{rng.randrange(60):02d} {rng.choice(['AM', 'PM'])}",
+            "Type": f"Type {rng.randrange(5)}",
+            "Location": f"Location {rng.randrange(30)}",
+            "Recorded": f"2024-03-{rng.randrange(1, 29):02d}T{rng.randrange(24):02d}:{rng.randrange(60):02d}:00",
+        }
+        for _ in range(count)
+    ] + [{"Type": "Type 0"}]
+
+def test_incremental_updates_match_a_full_load():
+    history = records(500)
+    full = IncidentAnalytics(store=None)
+    full.extend(history)
+    incremental = IncidentAnalytics(store=None)
+    for start in range(0, len(history), 7):
+        incremental.extend(history[start:start + 7])
+
+    now = datetime(2024, 3, 28, 12, 0)
+    assert incremental.metrics(now, with_percentiles=True) == full.metrics(now, with_percentiles=True)
+    assert list(incremental.sorted_times) == sorted(full.sorted_times)
+    assert incremental.metrics(now)["total"] == 501
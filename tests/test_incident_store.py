@@ -0,0 +1,35 @@
+import json
+
+from incident_store import IncidentStore
+
+def open_store(tmp_path):
+    return IncidentStore(log_path=str(tmp_path / "incidents.jsonl"), index_path=str(tmp_path / "incidents.idx.json"),
+                         legacy_path=None)
+
+def test_snapshots_get_rarer_as_the_store_grows(tmp_path):
+    store = open_store(tmp_path)
+    snapshots = []
+    write_snapshot = store._write_snapshot
+
+    def counting_snapshot():
+        snapshots.append(len(store))
+        write_snapshot()
+
+    store._write_snapshot = counting_snapshot
+    for number in range(2000):
+        # One incident every 30 seconds from 00:00
+        recorded = f"2024-03-01T{number // 120:02d}:{number // 2 % 60:02d}:{number % 2 * 30:02d}"
+        store.append({"No.": f"{number:04d}", "Location": "I15", "Recorded": recorded})
+
+    assert len(snapshots) < 20
+    assert all(later - earlier >= max(100, earlier // 4) for earlier, later in zip(snapshots, snapshots[1:]))
+
+    # Appends after the last snapshot are indexed again from the log on open
+    with open(tmp_path / "incidents.idx.json") as file:
+        assert json.load(file)["log_size"] < store.log_size
+    reopened = open_store(tmp_path)
+    assert len(reopened) == 2000
+    assert reopened.by_number("1999")[0]["No."] == "1999"
+    assert [record["No."] for record in reopened.between("2024-03-01T16:00:00", "2024-03-01T16:01:00")] == [
+        "1920", "1921", "1922",
+    ]
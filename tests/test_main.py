@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+import main
+from incident_store import IncidentStore
+from traffic_scraper import ComCenter
+
+INCIDENT = {
+    "No.": "0412",
+    "Time": "5:59 PM",
+    "Type": "1183-Trfc Collision-Unkn Inj",
+    "Location": "I15 N / Winchester Rd",
+    "Details": [],
+    "Latitude": 33.52,
+    "Longitude": -117.16,
+    "Center": "BCCC",
+}
+
+def test_published_local_summary_names_the_city(monkeypatch, tmp_path):
+    def slow_locate(record):
+        time.sleep(0.05)
+        record["Neighborhood"] = "N/A"
+        record["City"] = "Temecula"
+        return record
+
+    posted = []
+
+    async def fake_post(channel_id, message, image_path=None, image_bytes=None, location=None):
+        posted.append(message)
+        return None
+
+    monkeypatch.setattr(main, "SUMMARY_MODE", "local")
+    monkeypatch.setattr(main, "locate_incident", slow_locate)
+    monkeypatch.setattr(main, "fetch_map_image", lambda *args, **kwargs: b"png")
+    monkeypatch.setattr(main, "post_to_discord", fake_post)
+    monkeypatch.setattr(main, "incident_store", IncidentStore(
+        log_path=str(tmp_path / "incidents.jsonl"), index_path=str(tmp_path / "incidents.idx.json"), legacy_path=None,
+    ))
+    centers = {"BCCC": ComCenter("BCCC")}
+
+    async def enrich_and_publish():
+        await main.publish_incident(await main.enrich_incident(dict(INCIDENT)), centers)
+
+    asyncio.run(enrich_and_publish())
+    assert len(posted) == 1
+    assert posted[0].endswith("at I15 N / Winchester Rd in Temecula.")
@@ -0,0 +1,24 @@
+import asyncio
+
+from summarizer import Summarizer
+
+def test_incidents_that_differ_only_in_time_share_a_summary_without_it():
+    prompts = []
+
+    async def echo(prompt, max_tokens):
+        prompts.append(prompt)
+        return prompt
+
+    summarizer = Summarizer(api_key="test")
+    summarizer._complete = echo
+    first = {"No.": "0101", "Time": "5:59 PM", "Type": "1183-Trfc Collision-Unkn Inj", "Location": "I15 N / Winchester Rd"}
+    second = dict(first, **{"No.": "0102", "Time": "6:10 PM"})
+
+    async def summarize_both():
+        return await summarizer.summarize(first), await summarizer.summarize(second)
+
+    first_summary, second_summary = asyncio.run(summarize_both())
+    assert len(prompts) == 1
+    assert first_summary == second_summary
+    for value in ("5:59 PM", "0101"):
+        assert value not in first_summary
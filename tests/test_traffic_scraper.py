@@ -0,0 +1,74 @@
+import time
+
+import requests
+
+import traffic_scraper
+from traffic_scraper import ComCenter, fetch_incident_details
+
+NUMBERS = ["0003", "0002", "0001"]
+
+def detail_page(selected):
+    rows = "".join(f"<tr><td>{number}</td></tr>" for number in NUMBERS)
+    return (
+        '<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="next" />'
+        f'<table id="gvIncidents"><tr><th>No.</th></tr>{rows}</table>'
+        f'<span>{selected}</span>'
+    )
+
+class FakeResponse:
+    status_code = 200
+    encoding = "utf-8"
+    url = traffic_scraper.BASE_URL
+
+    def __init__(self, text, chunk_delay):
+        self.body = text.encode()
+        self.chunk_delay = chunk_delay
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    @property
+    def text(self):
+        return self.body.decode()
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), 16):
+            time.sleep(self.chunk_delay)
+            yield self.body[start:start + 16]
+
+class SlowSession:
+    """
+    Answers 'Select$N' postbacks; the number at hang_row never answers and
+    the one at trickle_row sends its page a few bytes at a time.
+    """
+    def __init__(self, hang_row, trickle_row):
+        self.hang_row = hang_row
+        self.trickle_row = trickle_row
+
+    def request(self, method, url, data=None, timeout=None, **kwargs):
+        row_index = int(data["__EVENTARGUMENT"].split("$")[1])
+        if row_index == self.hang_row:
+            time.sleep(timeout)
+            raise requests.ReadTimeout("no answer")
+        chunk_delay = 0.02 if row_index == self.trickle_row else 0.0
+        return FakeResponse(detail_page(NUMBERS[row_index]), chunk_delay)
+
+def test_chained_details_keep_to_each_incident_budget(monkeypatch):
+    monkeypatch.setattr(traffic_scraper, "extract_traffic_info", lambda html: {"Selected": html.rsplit("<span>", 1)[1][:4]})
+    center = ComCenter("BCCC")
+    center.viewstate = "page"
+    rows = [(2, {"No.": "0001"}), (1, {"No.": "0002"}), (0, {"No.": "0003"})]
+
+    started = time.perf_counter()
+    records = fetch_incident_details(center, rows, SlowSession(hang_row=2, trickle_row=1), parallelism=1,
+                                     budget=0.2, geocode=False)
+    elapsed = time.perf_counter() - started
+
+    assert [record["Selected"] for record in records] == ["0003"]
+    assert elapsed < 0.8
@@ -1,110 +1,470 @@
+import asyncio
 import requests
-from bs4 import BeautifulSoup
 from pprint import pprint
 from termcolor import colored
-import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from geopy.geocoders import Nominatim
+from requests.adapters import HTTPAdapter
+from dedupe_index import DedupeIndex, incident_date
+from geocache import GeoCache
+from offline_geocoder import OfflineGeocoder
+from chp_parser import extract_viewstate, parse_detail_page, parse_incident_table, table_fingerprint
 
-url = "https://cad.chp.ca.gov/traffic.aspx?__EVENTTARGET=ddlComCenter&ddlComCenter=BCCC"
+BASE_URL = "https://cad.chp.ca.gov/traffic.aspx"
+DEFAULT_CENTER = "BCCC"
+
+def center_url(center_code):
+    return f"{BASE_URL}?__EVENTTARGET=ddlComCenter&ddlComCenter={center_code}"
 
 HEADERS = {
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
 }
-PARAMS = {'ddlComCenter': 'BCCC'}
-VIEWSTATE_PATTERN = re.compile(r'<input\s+type="hidden"\s+name="__VIEWSTATE"\s+id="__VIEWSTATE"\s+value="([^"]+)"\s*/?>')
-LAT_LON_PATTERN = re.compile(r"(\d+\.\d+ -\d+\.\d+)")
-BRACKETS_PATTERN = re.compile(r'\[.*?\]')
-
-EXCLUDED_DETAILS = {'Unit At Scene', 'Unit Enroute', 'Unit Assigned'}
-
-def scrape_table():
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    table = soup.find('table', id='gvIncidents')
-    headers = [th.text.strip() for th in table.find_all('th')]
-    first_row = table.find_all('tr')[1]
-    cells = first_row.find_all('td')
-    row_data = [cell.text.strip() for cell in cells]
-    if "Location" in headers and row_data[headers.index("Location")] == "Media Log":
+PARAMS = {'ddlComCenter': DEFAULT_CENTER}
+
+# Seconds any CHP request may wait to connect or between bytes read, so a
+# hung connection cannot stall a poll forever
+REQUEST_TIMEOUT = 15.0
+
+# Bounded pool that runs the blocking scraper off the event loop
+SCRAPER_WORKERS = 8
+SCRAPER_EXECUTOR = ThreadPoolExecutor(max_workers=SCRAPER_WORKERS, thread_name_prefix="scraper")
+
+# One geocoder for the whole process, behind an on-disk cache and a 1 req/s limiter
+GEOLOCATOR = Nominatim(user_agent="GEOPY")
+GEOCODE_CACHE = GeoCache("geocode_cache.json")
+
+# "online" uses the cached Nominatim lookup, "offline" only the local
+# gazetteer, and "hybrid" the gazetteer with Nominatim for points outside it
+GEOCODER_MODE = "online"
+OFFLINE_GEOCODER = None
+
+# Detail postbacks: 1 chains the __VIEWSTATE returned by each 'Select$N'
+# response into the next one, the way a browser clicks through the rows.
+# Higher values post up to that many rows at once from the page viewstate.
+DETAIL_PARALLELISM = 1
+# Seconds one incident's detail fetch may take before it is left for the next poll
+DETAIL_BUDGET = 10.0
+
+class ComCenter:
+    """
+    Polling state of one CHP communication center: the viewstate of its
+    latest page, the dedupe index of incidents that have already been
+    handled and what is needed to recognise an unchanged table.
+    """
+    def __init__(self, code, dedupe=None):
+        self.code = code
+        self.url = center_url(code)
+        self.viewstate = None
+        self.dedupe = dedupe or DedupeIndex(path=None)
+        self.timings = []
+        self.last_error = None
+        # Change detection: validators for conditional GETs, the hash of the
+        # last table fragment and the rows parsed from it
+        self.etag = None
+        self.last_modified = None
+        self.fingerprint = None
+        self.rows = []
+        # Set by the first successful poll, which decides whether the listed
+        # rows are a backlog to skip
+        self.primed = False
+
+    def is_seen(self, row_data):
+        return self.dedupe.contains(self.code, row_data.get("No."), incident_date(row_data.get("Time")))
+
+    def mark_seen(self, record):
+        self.dedupe.add(self.code, record.get("No."), incident_date(record.get("Time")))
+
+def create_session(pool_size=10):
+    """
+    Creates a keep-alive session whose connection pool is shared by every
+    request of every center poll.
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+SESSION = create_session()
+
+class DeadlineExceeded(requests.Timeout):
+    """
+    A request was abandoned because its deadline passed.
+    """
+
+def timed_request(method, target_url, label, session=None, timings=None, deadline=None, **kwargs):
+    """
+    Sends a request over the pooled session and reports its own timing.
+    The (label, seconds) pair is also appended to timings when given.
+    Without a timeout, REQUEST_TIMEOUT applies.
+
+    With a deadline, a time.perf_counter() value, the timeout is cut to the
+    time left and the body is streamed; read it with read_until.
+    """
+    if kwargs.get("timeout") is None:
+        kwargs["timeout"] = REQUEST_TIMEOUT
+    if deadline is not None:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"{label} was not sent, its deadline has passed")
+        kwargs["timeout"] = min(kwargs["timeout"], remaining)
+        kwargs["stream"] = True
+    started = time.perf_counter()
+    response = (session or SESSION).request(method, target_url, **kwargs)
+    elapsed = time.perf_counter() - started
+    if timings is not None:
+        timings.append((label, elapsed))
+    print(f"{label} took {elapsed * 1000:.0f} ms")
+    return response
+
+def read_until(response, deadline):
+    """
+    Reads the text of a streamed response, giving up once deadline passes
+    however slowly the server sends it.
+    """
+    chunks = []
+    with response:
+        for chunk in response.iter_content(65536):
+            if time.perf_counter() > deadline:
+                raise DeadlineExceeded(f"{response.url} did not finish before its deadline")
+            chunks.append(chunk)
+    return b"".join(chunks).decode(response.encoding or "utf-8", errors="replace")
+
+def fetch_center_page(center, session=None):
+    """
+    Fetches a center's traffic page once. The same response provides the
+    incident table and the viewstate used by the detail postbacks.
+    Returns None when the server answers a conditional GET with 304.
+    """
+    headers = {}
+    if center.etag:
+        headers['If-None-Match'] = center.etag
+    if center.last_modified:
+        headers['If-Modified-Since'] = center.last_modified
+    response = timed_request("GET", center.url, f"[{center.code}] GET table", session, center.timings, headers=headers)
+    if response.status_code == 304:
         return None
-    return dict(zip(headers, row_data))
+    response.raise_for_status()
+    center.etag = response.headers.get('ETag')
+    center.last_modified = response.headers.get('Last-Modified')
+    center.viewstate = get_viewstate(response.text)
+    return response.text
+
+def parse_incident_rows(response_text):
+    """
+    Parses every row of the gvIncidents table in a single pass.
+    Returns a list of (row_index, row_dict) tuples in page order, where
+    row_index is the position used by the 'Select$N' postback.
+    """
+    return parse_incident_table(response_text)
 
 def get_viewstate(response_text):
-    match = VIEWSTATE_PATTERN.search(response_text)
-    return match.group(1) if match else None
+    return extract_viewstate(response_text)
 
 def extract_traffic_info(response_text):
-    matches = LAT_LON_PATTERN.findall(response_text)
-    pattern = re.compile(r'<td[^>]*colspan="6"[^>]*>(.*?)</td>', re.DOTALL)
-    matches_two = pattern.findall(response_text)
-    details = []
-    for match in matches_two:
-        clean_detail = BRACKETS_PATTERN.sub('', match).strip()
-        if not any(excluded_detail in clean_detail for excluded_detail in EXCLUDED_DETAILS):
-            details.append(clean_detail)
-    if matches:
-        for match in matches:
-            lat_str, lon_str = match.split()
-            if len(lat_str.split('.')[-1]) == 6 and len(lon_str.split('.')[-1]) == 6:
-                return {
-                    "Latitude": float(lat_str),
-                    "Longitude": float(lon_str),
-                    "Details": details
-                }
-    return None
+    return parse_detail_page(response_text)
 
-def get_location(lat, lon):
-    geolocator = Nominatim(user_agent="GEOPY")
-    location = geolocator.reverse((lat, lon), exactly_one=True)
+def reverse_geocode(lat, lon):
+    location = GEOLOCATOR.reverse((lat, lon), exactly_one=True)
     if location:
         return location.raw['address']
     else:
         return None
 
-def get_coordinates():
+def configure_geocoder(mode="online", gazetteer_path=None):
+    """
+    Selects how get_location resolves coordinates. The offline and hybrid
+    modes load the GeoJSON gazetteer at gazetteer_path once, up front.
+    """
+    global GEOCODER_MODE, OFFLINE_GEOCODER
+    if mode not in ("online", "offline", "hybrid"):
+        raise ValueError(f"Unknown geocoder mode: {mode}")
+    if mode != "online":
+        if not gazetteer_path:
+            raise ValueError(f"Geocoder mode '{mode}' needs a gazetteer file")
+        OFFLINE_GEOCODER = OfflineGeocoder.from_file(gazetteer_path)
+        print(f"Loaded {len(OFFLINE_GEOCODER.features)} gazetteer boundaries from {gazetteer_path}")
+    GEOCODER_MODE = mode
+
+def get_location(lat, lon):
+    if GEOCODER_MODE != "online":
+        address = OFFLINE_GEOCODER.reverse(lat, lon)
+        if address or GEOCODER_MODE == "offline":
+            return address
+    return GEOCODE_CACHE.lookup(lat, lon, reverse_geocode)
+
+def get_incident_details(viewstate_value, row_index=0, center_code=DEFAULT_CENTER, session=None, timings=None):
+    """
+    Posts back the 'Select$N' event for the given table row and returns the
+    coordinates, details and location of that incident.
+    """
+    coordinates_data, _ = select_incident(viewstate_value, row_index, center_code, session, timings)
+    return coordinates_data
+
+def post_select(viewstate_value, row_index, center_code, session=None, timings=None, timeout=None, deadline=None):
+    """
+    Posts back the 'Select$N' event for a table row and returns the page.
+    Raises DeadlineExceeded if deadline passes before the page is read.
+    """
+    data = {
+        '__LASTFOCUS': '',
+        '__EVENTTARGET': 'gvIncidents',
+        '__EVENTARGUMENT': f'Select${row_index}',
+        '__VIEWSTATE': viewstate_value,
+        '__VIEWSTATEGENERATOR': 'B13DF00D',
+        'ddlComCenter': center_code,
+        'ddlSearches': 'Choose One',
+        'ddlResources': 'Choose One',
+    }
+    response = timed_request(
+        "POST", center_url(center_code), f"[{center_code}] POST Select${row_index}", session, timings,
+        params={'ddlComCenter': center_code}, data=data, timeout=timeout, deadline=deadline,
+    )
+    response.raise_for_status()
+    if deadline is not None:
+        return read_until(response, deadline)
+    return response.text
+
+def select_incident(viewstate_value, row_index, center_code, session=None, timings=None, timeout=None, geocode=True):
+    """
+    Runs one 'Select$N' postback. Returns the incident's coordinates data and
+    the __VIEWSTATE of the response, which can drive the next postback.
+    """
+    response_text = post_select(viewstate_value, row_index, center_code, session, timings, timeout)
+    coordinates_data = extract_traffic_info(response_text)
+    if coordinates_data and geocode:
+        locate_incident(coordinates_data)
+    return coordinates_data, get_viewstate(response_text)
+
+def select_listed_incident(center, viewstate_value, row_index, number, session=None, timeout=None, geocode=True,
+                           deadline=None):
+    """
+    Runs the 'Select$N' postback of incident number and checks that the
+    incident table of the response lists it at row_index. A new incident
+    listed on top shifts the rows, so on a mismatch it is selected once more
+    at its new index, or left out if it is no longer listed.
+
+    Returns (coordinates_data, next_viewstate, positions), where
+    coordinates_data is None for an incident left out and positions maps
+    every 'No.' of the response table to its row index. deadline bounds
+    both postbacks together.
+    """
+    for _ in range(2):
+        response_text = post_select(
+            viewstate_value, row_index, center.code, session, center.timings, timeout, deadline,
+        )
+        viewstate_value = get_viewstate(response_text) or viewstate_value
+        positions = {row_data.get("No."): index for index, row_data in parse_incident_table(response_text)}
+        if positions.get(number) == row_index:
+            coordinates_data = extract_traffic_info(response_text)
+            if coordinates_data and geocode:
+                locate_incident(coordinates_data)
+            return coordinates_data, viewstate_value, positions
+        if number not in positions:
+            print(f"[{center.code}] Incident {number} is no longer listed.")
+            break
+        print(f"[{center.code}] Incident {number} moved from row {row_index} to row {positions[number]}.")
+        row_index = positions[number]
+    return None, viewstate_value, positions
+
+def locate_incident(record):
+    """
+    Adds the 'Neighborhood' and 'City' of the record's coordinates to it.
+    """
+    location_info = get_location(record['Latitude'], record['Longitude'])
+    if location_info:
+        record['Neighborhood'] = location_info.get('neighbourhood', 'N/A')
+        record['City'] = location_info.get('city', 'N/A')
+    return record
+
+def fetch_incident_details(center, rows, session=None, parallelism=None, budget=None, geocode=True):
+    """
+    Fetches the details of several table rows and returns one merged record
+    per incident, in the order of rows.
+
+    With parallelism 1 the postbacks are chained, each one using the
+    viewstate returned by the previous one. With a higher value up to that
+    many rows are posted at once from the page viewstate. Every response is
+    checked to have selected the intended incident before it is merged, and
+    a chain follows the row indexes of the latest response.
+
+    Each incident gets budget seconds of wall-clock time. Incidents that
+    fail or run over are left out so the next poll retries them, and never
+    hold up the rest of the batch. A chain abandons the postbacks of an
+    incident that runs over and goes on from the last completed response.
+    """
+    parallelism = parallelism or DETAIL_PARALLELISM
+    budget = budget or DETAIL_BUDGET
+
+    def merge(row_data, coordinates_data):
+        row_data.pop("Area", None)
+        return {**row_data, **coordinates_data, "Center": center.code}
+
+    merged = []
+    if parallelism <= 1:
+        viewstate_value = center.viewstate
+        positions = {}
+        for row_index, row_data in rows:
+            number = row_data.get("No.")
+            try:
+                coordinates_data, next_viewstate, positions = select_listed_incident(
+                    center, viewstate_value, positions.get(number, row_index), number, session, budget, geocode,
+                    deadline=time.perf_counter() + budget,
+                )
+            except requests.Timeout:
+                # The requests timeout is cut to the time left, so this is the budget too
+                print(f"[{center.code}] Incident {number} exceeded its {budget:g}s budget.")
+                continue
+            except requests.RequestException as e:
+                print(f"[{center.code}] Request failed for incident {number}: {e}")
+                continue
+            viewstate_value = next_viewstate
+            if coordinates_data:
+                merged.append(merge(row_data, coordinates_data))
+        return merged
+
+    executor = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix=f"details-{center.code}")
+    futures = [
+        (row_data, executor.submit(
+            select_listed_incident, center, center.viewstate, row_index, row_data.get("No."), session, budget, geocode,
+        ))
+        for row_index, row_data in rows
+    ]
+    deadline = time.perf_counter()
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        viewstate_value = get_viewstate(response.text)
-        if not viewstate_value:
+        for position, (row_data, future) in enumerate(futures):
+            # Rows queue behind the first `parallelism` ones, so each wave of
+            # postbacks adds one budget to the deadline
+            if position % parallelism == 0:
+                deadline += budget
+            try:
+                coordinates_data, _, _ = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+            except FutureTimeoutError:
+                print(f"[{center.code}] Incident {row_data.get('No.')} exceeded its {budget:g}s budget.")
+                continue
+            except requests.RequestException as e:
+                print(f"[{center.code}] Request failed for incident {row_data.get('No.')}: {e}")
+                continue
+            if coordinates_data:
+                merged.append(merge(row_data, coordinates_data))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return merged
+
+def get_merged_data():
+    center = ComCenter(DEFAULT_CENTER)
+    try:
+        page_text = fetch_center_page(center)
+        rows = parse_incident_rows(page_text)
+        if not rows:
+            return None
+        _, table_data = rows[0]
+        if table_data.get("Location") == "Media Log":
+            print("Skipping 'Media Log' entry.")
+            return None
+        if not center.viewstate:
             print("No __VIEWSTATE found on the page.")
             return None
-        data = {
-            '__LASTFOCUS': '',
-            '__EVENTTARGET': 'gvIncidents',
-            '__EVENTARGUMENT': 'Select$0',
-            '__VIEWSTATE': viewstate_value,
-            '__VIEWSTATEGENERATOR': 'B13DF00D',
-            'ddlComCenter': 'BCCC',
-            'ddlSearches': 'Choose One',
-            'ddlResources': 'Choose One',
-        }
-        response = requests.post(url, params=PARAMS, headers=HEADERS, data=data)
-        response.raise_for_status()
-        coordinates_data = extract_traffic_info(response.text)
-        if coordinates_data:
-            location_info = get_location(coordinates_data['Latitude'], coordinates_data['Longitude'])
-            if location_info:
-                coordinates_data['Neighborhood'] = location_info.get('neighbourhood', 'N/A')
-                coordinates_data['City'] = location_info.get('city', 'N/A')
-        return coordinates_data
+        table_data.pop("Area", None)
+        coordinates_data = get_incident_details(center.viewstate, 0, center.code, timings=center.timings)
     except requests.RequestException as e:
         print(f"Request failed: {e}")
         return None
-
-def get_merged_data():
-    table_data = scrape_table()
-    if table_data is None:
-        print("Skipping 'Media Log' entry.")
-        return None
-    if "Area" in table_data:
-        del table_data["Area"]
-    coordinates_data = get_coordinates()
     if coordinates_data:
         return {**table_data, **coordinates_data}
     return None
 
+def get_new_incidents(center, session=None, geocode=True, in_flight=()):
+    """
+    Scrapes the whole incident table of a center with one GET and returns a
+    merged record for every row whose 'No.' the center has not seen yet,
+    oldest first. Row indexes and the viewstate come from the same response,
+    so every 'Select$N' postback refers to the table that was diffed. Rows
+    whose (center, 'No.') key is in in_flight are still being posted and are
+    skipped without a detail postback.
+
+    When the table is unchanged (304 or same fingerprint) the rows parsed
+    last time are reused, so an idle poll costs one GET and one hash.
+
+    If none of the listed rows is seen on the center's first successful poll
+    (fresh install, new dedupe index or a newly added center), all but the
+    newest are marked seen instead of being posted.
+    """
+    center.timings = []
+    try:
+        page_text = fetch_center_page(center, session)
+    except requests.RequestException as e:
+        print(f"[{center.code}] Request failed: {e}")
+        center.last_error = e
+        return []
+    center.last_error = None
+
+    if page_text is not None:
+        fingerprint = table_fingerprint(page_text)
+        if fingerprint != center.fingerprint:
+            center.fingerprint = fingerprint
+            center.rows = parse_incident_rows(page_text)
+
+    new_rows = [
+        (row_index, dict(row_data)) for row_index, row_data in center.rows
+        if not center.is_seen(row_data) and row_data.get("Location") != "Media Log"
+        and (center.code, row_data.get("No.")) not in in_flight
+    ]
+    if not center.primed:
+        center.primed = True
+        if new_rows and not any(center.is_seen(row_data) for _, row_data in center.rows):
+            # The table lists newest first
+            for _, row_data in new_rows[1:]:
+                center.mark_seen(row_data)
+            if len(new_rows) > 1:
+                print(f"[{center.code}] First poll: marked {len(new_rows) - 1} listed incidents as seen.")
+            new_rows = new_rows[:1]
+    if not new_rows:
+        return []
+
+    if not center.viewstate:
+        print(f"[{center.code}] No __VIEWSTATE found on the page.")
+        return []
+
+    return fetch_incident_details(center, list(reversed(new_rows)), session, geocode=geocode)
+
+def listed_numbers(center):
+    """
+    Incident numbers in the center's most recently fetched table.
+    """
+    return {row_data.get("No.") for _, row_data in center.rows}
+
+def refresh_details(center, numbers, session=None):
+    """
+    Re-selects already posted incidents that are still listed and returns
+    {No.: Details} with their current detail logs. No geocoding is done, as
+    the location of an incident does not change.
+    """
+    rows = [(row_index, dict(row_data)) for row_index, row_data in center.rows if row_data.get("No.") in numbers]
+    if not rows or not center.viewstate:
+        return {}
+    records = fetch_incident_details(center, rows, session, geocode=False)
+    return {record["No."]: record.get("Details", []) for record in records}
+
+async def poll_centers_async(centers, session=None, geocode=True, in_flight=frozenset()):
+    """
+    Polls every center concurrently over one shared connection pool and
+    returns the new incidents of all centers, so a cycle takes about as long
+    as the slowest center rather than the sum of all of them. Every center
+    is scraped on SCRAPER_EXECUTOR, so slow CHP responses never block the
+    event loop, and at most SCRAPER_WORKERS centers are fetched at once.
+    in_flight is read from the scraper threads, so pass a snapshot.
+    """
+    loop = asyncio.get_running_loop()
+    batches = await asyncio.gather(*(
+        loop.run_in_executor(SCRAPER_EXECUTOR, get_new_incidents, center, session, geocode, in_flight)
+        for center in centers
+    ))
+    return [incident for batch in batches for incident in batch]
+
 if __name__ == "__main__":
     merged_data = get_merged_data()
     if merged_data: